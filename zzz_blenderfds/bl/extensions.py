@@ -2,15 +2,70 @@
 
 import bpy, time, sys
 from bpy.types import Object, Material, Scene
+from contextlib import contextmanager
 
-from ..types import BFNamelist
+from ..types import BFNamelist, get_instance
 from ..exceptions import BFException
 from .. import geometry
 from .. import fds
 from .. import config
+from .. import profiler
 
 DEBUG = False
 
+### Parent to children index
+
+# The export walks the tree of objects, from the scene (parent None) to the leaves.
+# While the children context is active, the children of all objects are indexed once,
+# in export order, so the walk is linear in the number of objects.
+
+_children_index = None # {parent name or None: [ob, ...], ...}, None if no children context is active
+_children_progress = [0, 0] # [walked objects, total objects] of the active children context
+
+def get_children_index(obs) -> "{parent name or None: [ob, ...], ...}":
+    """Get the index of obs by parent name, children sorted in export order."""
+    index = dict()
+    for ob in obs: index.setdefault(ob.parent and ob.parent.name, list()).append(ob)
+    for children_obs in index.values():
+        children_obs.sort(key=lambda k:k.name) # Order by element name
+        children_obs.sort(key=lambda k:k.bf_namelist_cls!=("ON_MESH")) # Order MESHes first (False then True)
+    return index
+
+@contextmanager
+def children_context(context):
+    """Activate the children context: the children of all objects are indexed once, till the end of the context."""
+    global _children_index
+    if _children_index is not None: # already active, eg. nested
+        yield
+        return
+    _children_index = get_children_index(context.scene.objects)
+    _children_progress[:] = 0, len(context.scene.objects)
+    try: yield
+    finally: _children_index = None
+
+def get_children_progress() -> "(walked objects, total objects)":
+    """Get the progress of the export walk in the active children context."""
+    return tuple(_children_progress)
+
+### Running modal export
+
+# The modal export keeps its export contexts (MULT, OBST, children, profiler) open between timer events,
+# while the interface is live. Other exports would read its indexes, so they are refused till it ends.
+
+_is_modal_export_running = False
+
+@contextmanager
+def modal_export_context():
+    """Mark a modal export as running, till the end of the context."""
+    global _is_modal_export_running
+    _is_modal_export_running = True
+    try: yield
+    finally: _is_modal_export_running = False
+
+def is_modal_export_running() -> "bool":
+    """Check if a modal export is running."""
+    return _is_modal_export_running
+
 ### Extend bpy.type.Object
 
 class BFObject():
@@ -24,7 +79,7 @@ class BFObject():
         """Returns an instance of the linked Object namelist class."""
         if self.type != "MESH" or self.bf_is_tmp: return None
         ON_cls = BFNamelist.all.get(self.bf_namelist_cls) # get class from name
-        if ON_cls: return ON_cls(element=self) # create instance from class
+        if ON_cls: return get_instance(ON_cls, self) # get cached instance of class
 
     def set_default_appearance(self, context):
         """Set default object appearance."""
@@ -40,40 +95,48 @@ class BFObject():
         # Set show_transparent
         self.show_transparent = True
 
-    def _myself_to_fds(self, context) -> "list":
-        """Export myself in FDS notation."""
-        bodies = list()
-        if self.bf_export:
-            if self.type == "MESH":
-                bf_namelist = self.bf_namelist
-                if bf_namelist:
-                    body = bf_namelist.to_fds(context)
-                    if body: bodies.append(body)  # could be None
-            elif self.type == "EMPTY":
-                bodies.append("! -- {}: {}\n".format(self.name, self.bf_fyi))
-        return bodies
-
-    def _children_to_fds(self, context) -> "list":
-        """Export children in FDS notation."""
+    def _myself_to_fds(self, context):
+        """Export myself in FDS notation, yield text pieces."""
+        if not self.bf_export: return
+        if self.type == "MESH":
+            bf_namelist = self.bf_namelist
+            mult = fds.mult.get(self)
+            if mult and mult[0] != self.name: return # a copy, exported by the MULT of its base object
+            if fds.obst.is_merged(self): return # exported by the base object of its group
+            if not bf_namelist: return
+            if mult:
+                yield mult[2]
+                pieces = bf_namelist.to_fds_pieces(context, extra_params=("MULT_ID='{}'".format(mult[1]),))
+            else: pieces = bf_namelist.to_fds_pieces(context)
+            yield from profiler.profile_pieces(self.name, self.bf_namelist_cls, pieces)
+        elif self.type == "EMPTY":
+            yield "! -- {}: {}\n".format(self.name, self.bf_fyi)
+
+    def _children_to_fds(self, context):
+        """Export children in FDS notation, yield text pieces."""
         # Init
-        children_obs = [ob for ob in context.scene.objects if ob.parent == self]
-        children_obs.sort(key=lambda k:k.name) # Order by element name
-        children_obs.sort(key=lambda k:k.bf_namelist_cls!=("ON_MESH")) # Order MESHes first (False then True)
+        if _children_index is not None: children_obs = _children_index.get(self and self.name, ())
+        else:
+            children_obs = [ob for ob in context.scene.objects if ob.parent == self]
+            children_obs.sort(key=lambda k:k.name) # Order by element name
+            children_obs.sort(key=lambda k:k.bf_namelist_cls!=("ON_MESH")) # Order MESHes first (False then True)
         # Children to_fds
-        bodies = list()
+        is_empty = True
         for ob in children_obs:
-            body = ob.to_fds(context, with_children=True)
-            if body: bodies.append(body)  # could be None
-        if bodies: bodies.append("\n")
-        # Return
-        return bodies
-   
+            _children_progress[0] += 1
+            for piece in ob.to_fds_pieces(context, with_children=True):
+                is_empty = False
+                yield piece
+        if not is_empty: yield "\n"
+
+    def to_fds_pieces(self, context, with_children=False):
+        """Export myself and children in FDS notation, yield text pieces."""
+        yield from self._myself_to_fds(context)
+        if with_children: yield from self._children_to_fds(context)
+
     def to_fds(self, context, with_children=False) -> "str or None":
         """Export myself and children in FDS notation."""
-        bodies = list()
-        bodies.extend(self._myself_to_fds(context))
-        if with_children: bodies.extend(self._children_to_fds(context))
-        return "".join(bodies)
+        return "".join(self.to_fds_pieces(context, with_children))
         
 # Add methods to original Blender type
 
@@ -82,6 +145,7 @@ Object.bf_namelist = BFObject.bf_namelist
 Object.set_default_appearance = BFObject.set_default_appearance
 Object._myself_to_fds = BFObject._myself_to_fds
 Object._children_to_fds = BFObject._children_to_fds
+Object.to_fds_pieces = BFObject.to_fds_pieces
 Object.to_fds = BFObject.to_fds
 
 ### Extend bpy.type.Material
@@ -96,7 +160,7 @@ class BFMaterial():
     def bf_namelist(self) -> "BFNamelist instance or None": # Only one namelist per material
         """Returns an instance of the linked Material namelist class"""
         MN_cls = BFNamelist.all.get(self.bf_namelist_cls) # get class from name
-        if MN_cls: return MN_cls(element=self) # create instance from class
+        if MN_cls: return get_instance(MN_cls, self) # get cached instance of class
 
     def set_default_appearance(self, context):
         """Set default material appearance."""
@@ -126,7 +190,7 @@ class BFScene():
     @property
     def bf_namelists(self) -> "List of BFNamelist instances":  # Many namelists per scene
         """Returns a list of instances of the linked Scene namelist classes"""
-        bf_namelists = [bf_namelist(element=self) for bf_namelist in BFNamelist.all if bf_namelist.bpy_type == Scene]
+        bf_namelists = [get_instance(bf_namelist, self) for bf_namelist in BFNamelist.all if bf_namelist.bpy_type == Scene]
         bf_namelists.sort(key=lambda k:k.enum_id) # Order Scene namelists by enum_id
         return bf_namelists
 
@@ -136,33 +200,38 @@ class BFScene():
 
     # Export
 
-    def _myself_to_fds(self, context) -> "list":
-        """Export myself in FDS notation."""
-        bodies = list()
+    def _myself_to_fds(self, context):
+        """Export myself in FDS notation, yield text pieces."""
+        is_empty = True
         for bf_namelist in self.bf_namelists:
-            body = bf_namelist.to_fds(context)
-            if body: bodies.append(body)  # Could be None
-        if bodies: bodies.append("\n")
-        return bodies
+            for piece in bf_namelist.to_fds_pieces(context):
+                is_empty = False
+                yield piece
+        if not is_empty: yield "\n"
 
-    def _children_to_fds(self, context) -> "list":
-        """Export children in FDS notation."""
-        # Init
-        bodies = list()
+    def _children_to_fds(self, context):
+        """Export children in FDS notation, yield text pieces."""
         # Materials
-        bodies.append("! --- Boundary conditions (from Blender Materials)\n\n")
+        yield "! --- Boundary conditions (from Blender Materials)\n\n"
         mas = [ma for ma in bpy.data.materials]
         mas.sort(key=lambda k:k.name) # Alphabetic order by element name
         for ma in mas:
             body = ma.to_fds(context)
-            if body: bodies.append(body)
-        bodies.append("\n")
+            if body: yield body
+        yield "\n"
         # Objects
-        bodies.append("! --- Geometric entities (from Blender Objects)\n\n")
-        bodies.extend(Object._children_to_fds(self=None, context=context)) # Call objects without a parent
-        bodies.append("\n")
-        # Return
-        return bodies
+        yield "! --- Geometric entities (from Blender Objects)\n\n"
+        yield from Object._children_to_fds(self=None, context=context) # Call objects without a parent
+        yield "\n"
+
+    def _voxelize_children(self, context):
+        """Voxelize exported objects in parallel, results are cached for their export, yield empty text pieces at each step."""
+        obs = list()
+        for ob in context.scene.objects:
+            if not ob.bf_export or ob.bf_xb not in ("VOXELS", "PIXELS") or fds.mult.is_instance(ob): continue
+            bf_namelist = ob.bf_namelist
+            if bf_namelist and bf_namelist.bf_prop_XB: obs.append(ob)
+        for _ in geometry.voxel_cache.prefetch(context, obs): yield "" # let the modal export step
 
     def _header_to_fds(self, context) -> "tuple":
         """Export header in FDS notation."""
@@ -188,21 +257,25 @@ class BFScene():
             else: bodies.append("\n\n")
         return bodies
 
-    def to_fds(self, context, with_children=False) -> "str or None":
-        """Export myself and children (full FDS case) in FDS notation."""
+    def to_fds_pieces(self, context, with_children=False):
+        """Export myself and children (full FDS case) in FDS notation, yield text pieces."""
         # Init
         t0 = time.time()
-        bodies = list()
         # Header, Scene, free_text
-        if with_children: bodies.extend(self._header_to_fds(context))
-        bodies.extend(self._myself_to_fds(context))
-        bodies.extend(self._free_text_to_fds(context))
+        if with_children: yield from self._header_to_fds(context)
+        yield from self._myself_to_fds(context)
+        yield from self._free_text_to_fds(context)
         # Materials, objects, TAIL
         if with_children:
-            bodies.extend(self._children_to_fds(context))
-            bodies.append("&TAIL /\n! Generated in {0:.0f} s.".format((time.time()-t0)))
-        # Return
-        return "".join(bodies)
+            with fds.mult.mult_context(context):
+                if self.bf_voxel_parallel: yield from self._voxelize_children(context)
+                with fds.obst.obst_context(context), children_context(context): yield from self._children_to_fds(context)
+            geometry.voxel_cache.save_sidecar(context)
+            yield "&TAIL /\n! Generated in {0:.0f} s.".format((time.time()-t0))
+
+    def to_fds(self, context, with_children=False) -> "str or None":
+        """Export myself and children (full FDS case) in FDS notation."""
+        return "".join(self.to_fds_pieces(context, with_children))
 
     def to_ge1(self, context) -> "str or None":
         """Export my geometry in FDS GE1 notation."""
@@ -285,7 +358,9 @@ Scene.set_default_appearance = BFScene.set_default_appearance
 Scene._myself_to_fds = BFScene._myself_to_fds
 Scene._header_to_fds = BFScene._header_to_fds
 Scene._free_text_to_fds = BFScene._free_text_to_fds
+Scene._voxelize_children = BFScene._voxelize_children
 Scene._children_to_fds = BFScene._children_to_fds
+Scene.to_fds_pieces = BFScene.to_fds_pieces
 Scene.to_fds = BFScene.to_fds
 Scene.to_ge1 = BFScene.to_ge1
 
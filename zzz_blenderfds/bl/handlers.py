@@ -3,7 +3,9 @@
 import bpy
 
 from .. import fds
+from .. import geometry
 from .. import config
+from ..types import clear_instances
 
 DEBUG = False
 
@@ -14,12 +16,16 @@ def register():
     DEBUG and print("BFDS: handlers.py register")
     bpy.app.handlers.load_post.append(_load_post)
     bpy.app.handlers.save_pre.append(_save_pre)
+    bpy.app.handlers.undo_post.append(_undo_post)
+    bpy.app.handlers.redo_post.append(_undo_post)
 
 def unregister():
     """Unregister handlers"""
     DEBUG and print("BFDS: handlers.py unregister")
     bpy.app.handlers.load_post.append(_load_post)
     bpy.app.handlers.save_pre.append(_save_pre)
+    bpy.app.handlers.undo_post.remove(_undo_post)
+    bpy.app.handlers.redo_post.remove(_undo_post)
 
 
 ### Definitions
@@ -29,6 +35,9 @@ def _load_post(self):
     """This function is run after each time a Blender file is loaded"""
     # Init
     context = bpy.context
+    clear_instances() # of the previous file
+    geometry.voxelize.clear_tiled_memory()
+    geometry.voxel_cache.clear()
     # Check file format version
     check_file_version(context)
     # Init FDS default materials
@@ -37,12 +46,19 @@ def _load_post(self):
     for scene in bpy.data.scenes: scene.set_default_appearance(context=None)
     # Open the right file in editor
     fds.head.set_free_text_file(context, context.scene)
+
+@bpy.app.handlers.persistent
+def _undo_post(self):
+    """This function is run after each undo and redo"""
+    clear_instances() # undo reallocates the elements
     
 @bpy.app.handlers.persistent
 def _save_pre(self):
     """This function is run before each time a Blender file is saved"""
     # Set file format version
     set_file_version(bpy.context)
+    # Save voxelization cache, if requested
+    geometry.voxel_cache.save_sidecar(bpy.context)
 
 
 ### Manage file version and conversion to new formats
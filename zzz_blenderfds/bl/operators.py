@@ -8,6 +8,7 @@ from ..types import BFProp
 from ..exceptions import BFException
 from .. import fds
 from .. import geometry
+from .extensions import is_modal_export_running
 
 # TODO search operators fro MATL_ID, PROP_ID...
 
@@ -204,6 +205,10 @@ class _COMMON_bf_show_fds_code():
         self.bf_fds_code = ob.to_fds(context)
 
     def invoke(self, context, event):
+        # Check no modal export is running, its export contexts are open
+        if is_modal_export_running():
+            self.report({"ERROR"}, "FDS export running, wait or press ESC")
+            return {'CANCELLED'}
         # Init
         w = context.window_manager.windows[0]
         w.cursor_modal_set("WAIT")
@@ -367,6 +372,10 @@ class OBJECT_OT_bf_show_fds_geometries(Operator):
     bl_description = "Show geometries as exported to FDS"
 
     def execute(self, context):
+        # Evaluate object geometry once, for XB, XYZ and PB
+        with geometry.geom_utils.geometry_context(): return self._execute(context)
+
+    def _execute(self, context):
         # Init
         w = context.window_manager.windows[0]
         w.cursor_modal_set("WAIT")
@@ -504,7 +513,8 @@ class MATERIAL_OT_bf_set_tau_q(Operator):
             if ob.type == "MESH" and ob.bf_export \
             and ob.active_material == ma \
             and ob.bf_namelist.all_bf_props.get("OP_SURF_ID"))
-        for ob in obs: burner_area += geometry.geom_utils.get_global_area(context, ob)
+        with geometry.geom_utils.geometry_context():
+            for ob in obs: burner_area += geometry.geom_utils.get_global_area(context, ob)
         # Set defaults to estimated values
         self.bf_burner_area = burner_area
         self.bf_hrr_max = ma.bf_hrrpua * burner_area
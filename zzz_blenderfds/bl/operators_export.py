@@ -1,12 +1,17 @@
 """BlenderFDS, export operators"""
 
-import bpy, os.path
+import bpy, os.path, traceback
+from time import time
+from contextlib import ExitStack
 
 from bpy.types import Operator
 from bpy_extras.io_utils import ExportHelper
 
 from ..exceptions import BFException
-from ..utils import is_writable, write_to_file
+from ..types import clear_instances
+from ..utils import is_writable, write_pieces_to_file, AtomicFile, BackgroundWriter
+from .. import geometry, profiler
+from .extensions import get_children_progress, modal_export_context, is_modal_export_running
 
 
 DEBUG = False
@@ -23,9 +28,9 @@ def export_OT_fds_case_menu(self, context):
     sc = context.scene
     if sc.bf_head_directory: directory = sc.bf_head_directory
     if sc.name: basename = "{0}.fds".format(bpy.path.clean_name(sc.name))
-    # Call the exporter operator
+    # Call the modal exporter operator, that does not block the interface
     filepath = "{0}/{1}".format(directory, basename)
-    self.layout.operator("export_scene.fds_case", text="Scene to FDS Case (.fds)").filepath = filepath
+    self.layout.operator("export_scene.fds_case_modal", text="Scene to FDS Case (.fds)").filepath = filepath
 
 class export_OT_fds_case(Operator, ExportHelper):
     """Export current Blender Scene to an FDS case file, operator"""
@@ -36,54 +41,217 @@ class export_OT_fds_case(Operator, ExportHelper):
     filter_glob = bpy.props.StringProperty(default="*.fds", options={'HIDDEN'})
 
     def execute(self, context):
+        # Check no modal export is running, its export contexts are open
+        if is_modal_export_running():
+            self.report({"ERROR"}, "FDS export running, wait or press ESC")
+            return {'CANCELLED'}
+        # Evaluate each object geometry once, for FDS and GE1 files, profile if requested
+        try:
+            with geometry.geom_utils.geometry_context(), profiler.profile_context(context.scene.bf_export_profile):
+                return self._execute(context)
+        finally: clear_instances() # of the exported elements
+
+    def _get_filepath(self) -> "filepath":
+        """Get the absolute FDS filepath."""
+        filepath = self.filepath
+        if not filepath.lower().endswith('.fds'): filepath += '.fds'
+        return bpy.path.abspath(filepath)
+
+    def _get_profile_msg(self, filepath) -> "msg":
+        """Save profile next to filepath, if requested, and get the slowest objects message."""
+        if not profiler.is_active(): return str()
+        profiler.save(filepath)
+        return ", slowest: " + ", ".join("{} {:.1f} s".format(name, t) for name, t in profiler.get_slowest())
+
+    def _start_ge1(self, context, filepath) -> "BackgroundWriter or None":
+        """Get GE1 render file data, then format and write it next to filepath in a background thread, if requested."""
+        sc = context.scene
+        if not sc.bf_dump_render_file: return None
+        # Prepare GE1 filepath
+        DEBUG and print("BFDS: export_OT_fds_case: Exporting current Blender Scene '{}' to .ge1 render file".format(sc.name))
+        filepath = filepath[:-4] + '.ge1'
+        if not is_writable(filepath): raise IOError("GE1 file not writable")
+        # Get GE1 data from Blender here, as Blender data cannot be accessed from other threads
+        ge1_data = geometry.to_ge1.get_ge1_data(context, sc)
+        ge1_writer = BackgroundWriter(filepath, geometry.to_ge1.get_ge1_pieces, *ge1_data)
+        ge1_writer.start()
+        return ge1_writer
+
+    def _execute(self, context):
         # Init
         w = context.window_manager.windows[0]
         w.cursor_modal_set("WAIT")
         sc = context.scene
         # Prepare FDS filepath
         DEBUG and print("BFDS: export_OT_fds_case: Exporting current Blender Scene '{}' to FDS case file".format(sc.name))
-        filepath = self.filepath
-        if not filepath.lower().endswith('.fds'): filepath += '.fds'
-        filepath = bpy.path.abspath(filepath)
+        filepath = self._get_filepath()
         # Check FDS filepath writable
         if not is_writable(filepath):
             w.cursor_modal_restore()
             self.report({"ERROR"}, "FDS file not writable, cannot export")
             return {'CANCELLED'}
-        # Prepare FDS file
-        try: fds_file = sc.to_fds(context=context, with_children=True)
+        # GE1 description file requested? Write it while the FDS file is exported
+        try: ge1_writer = self._start_ge1(context, filepath)
         except BFException as err:
             w.cursor_modal_restore()
             self.report({"ERROR"}, str(err))
             return{'CANCELLED'}
-        # Write FDS file
-        if not write_to_file(filepath, fds_file):
+        except IOError:
             w.cursor_modal_restore()
-            self.report({"ERROR"}, "FDS file not writable, cannot export")
+            self.report({"ERROR"}, "GE1 file not writable, cannot export")
             return {'CANCELLED'}
-        # GE1 description file requested?
-        if sc.bf_dump_render_file:
-            # Prepare GE1 filepath
-            DEBUG and print("BFDS: export_OT_fds_case: Exporting current Blender Scene '{}' to .ge1 render file".format(sc.name))
-            filepath = filepath[:-4] + '.ge1'
-            if not is_writable(filepath):
-                w.cursor_modal_restore()
-                self.report({"ERROR"}, "GE1 file not writable, cannot export")
-                return {'CANCELLED'}              
-            # Prepare GE1 file
-            try: ge1_file = sc.to_ge1(context=context)
-            except BFException as err:
-                w.cursor_modal_restore()
-                self.report({"ERROR"}, str(err))
-                return{'CANCELLED'}
-            # Write GE1 file
-            if not write_to_file(filepath, ge1_file):
+        # Prepare and write FDS file, piece by piece; on any failure discard the GE1 file and restore the cursor
+        is_written = False
+        try: is_written = write_pieces_to_file(filepath, sc.to_fds_pieces(context=context, with_children=True))
+        except BFException as err:
+            self.report({"ERROR"}, str(err))
+            return{'CANCELLED'}
+        finally:
+            if not is_written:
+                if ge1_writer: ge1_writer.discard()
                 w.cursor_modal_restore()
-                self.report({"ERROR"}, "GE1 file not writable, cannot export")
-                return {'CANCELLED'}      
+        if not is_written:
+            self.report({"ERROR"}, "FDS file not writable, cannot export")
+            return {'CANCELLED'}
+        # Save profile, if requested
+        msg = "FDS case exported" + self._get_profile_msg(filepath)
+        # Wait for the GE1 file
+        if ge1_writer and not ge1_writer.commit():
+            w.cursor_modal_restore()
+            self.report({"ERROR"}, "GE1 file not writable, cannot export")
+            return {'CANCELLED'}
         # End
         w.cursor_modal_restore()
         DEBUG and print("BFDS: export_OT_fds_case: End.")
-        self.report({"INFO"}, "FDS case exported")
+        self.report({"INFO"}, msg)
+        return {'FINISHED'}
+
+# Blender data is not thread safe, so the modal exporter cannot move the export to a worker thread.
+# Instead, it consumes the generator of FDS text pieces in short chunks at each timer event,
+# so the interface stays responsive, shows the progress of the export walk and can be cancelled by ESC.
+# Voxelizations still run in the worker process pool, if requested (bf_voxel_parallel),
+# and the exporter steps while waiting for it. OBST groups are merged lazily, one group at a time.
+# Limitation: a single object voxelization, or a single OBST group merge, runs in one step
+# and blocks the interface until it is done.
+# The FDS file is written to a temporary file, that replaces the target only when the export is complete.
+# Between the chunks the interface redraws and the view can be navigated,
+# but other events are consumed, so the user cannot edit the exported objects:
+# the MULT and OBST indexes, built at the beginning of the export, do not get stale.
+# Other exports are refused while the export contexts are open (modal_export_context).
+# Each chunk opens its own geometry context and walks with its own Blender context (_StepContext),
+# so no evaluated geometry or context survives from one chunk to the next.
+
+class _StepContext():
+    """Blender context of the current modal export step"""
+
+    def __init__(self, context):
+        self.context = context
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
+class export_OT_fds_case_modal(export_OT_fds_case):
+    """Export current Blender Scene to an FDS case file without blocking the interface, modal operator.
+    A single object voxelization or OBST group merge still blocks until it is done."""
+    bl_label = "Export FDS"
+    bl_idname = "export_scene.fds_case_modal"
+    bl_description = "Export current Blender Scene as an FDS case file, press ESC to cancel"
+
+    chunk_time = .1 # s, max export time at each timer event
+    timer_step = .01 # s
+    pass_through_events = ( # view navigation and window events, that do not edit data
+        "MOUSEMOVE", "INBETWEEN_MOUSEMOVE", "MIDDLEMOUSE", "WHEELUPMOUSE", "WHEELDOWNMOUSE",
+        "TRACKPADPAN", "TRACKPADZOOM", "MOUSEROTATE", "NDOF_MOTION", "WINDOW_DEACTIVATE",
+        "TIMER_REPORT", "TIMERREGION",
+    )
+
+    def execute(self, context):
+        if is_modal_export_running():
+            self.report({"ERROR"}, "FDS export running, wait or press ESC")
+            return {'CANCELLED'}
+        sc = context.scene
+        DEBUG and print("BFDS: export_OT_fds_case_modal: Exporting current Blender Scene '{}' to FDS case file".format(sc.name))
+        # Prepare and check FDS filepath
+        self._filepath = self._get_filepath()
+        if not is_writable(self._filepath):
+            self.report({"ERROR"}, "FDS file not writable, cannot export")
+            return {'CANCELLED'}
+        try: self._out_file = AtomicFile(self._filepath)
+        except IOError:
+            self.report({"ERROR"}, "FDS file not writable, cannot export")
+            return {'CANCELLED'}
+        # Refuse other exports and profile if requested, till the end of the modal export
+        self._contexts = ExitStack()
+        self._contexts.enter_context(modal_export_context())
+        self._contexts.enter_context(profiler.profile_context(sc.bf_export_profile))
+        self._step_context = _StepContext(context)
+        self._pieces = sc.to_fds_pieces(context=self._step_context, with_children=True)
+        self._timer, self._ge1_writer = None, None
+        # GE1 description file requested? Write it while the FDS file is exported
+        try:
+            with geometry.geom_utils.geometry_context(): self._ge1_writer = self._start_ge1(context, self._filepath)
+        except BFException as err: return self._cancel(context, "ERROR", str(err))
+        except IOError: return self._cancel(context, "ERROR", "GE1 file not writable, cannot export")
+        # Start
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(self.timer_step, context.window)
+        wm.modal_handler_add(self)
+        wm.progress_begin(0, 100)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == "ESC": return self._cancel(context, "WARNING", "FDS export cancelled")
+        if event.type in self.pass_through_events: return {'PASS_THROUGH'}
+        if event.type != "TIMER": return {'RUNNING_MODAL'} # consume edits
+        # Write FDS text pieces, till the end of the chunk, evaluating each object geometry once in the chunk
+        t0 = time()
+        self._step_context.context = context
+        try:
+            with geometry.geom_utils.geometry_context():
+                for piece in self._pieces:
+                    self._out_file.write(piece)
+                    if time() - t0 > self.chunk_time: break
+                else: return self._finish(context)
+        except BFException as err: return self._cancel(context, "ERROR", str(err))
+        except ReferenceError: return self._cancel(context, "ERROR", "Exported objects removed, export cancelled")
+        except IOError: return self._cancel(context, "ERROR", "FDS file not writable, cannot export")
+        except Exception as err: # any other, eg. from voxelization: clean up anyway
+            traceback.print_exc()
+            return self._cancel(context, "ERROR", "Unexpected error, export cancelled: {}".format(err))
+        # Show progress
+        walked, total = get_children_progress()
+        context.window_manager.progress_update(total and 100 * walked // total)
+        return {'RUNNING_MODAL'}
+
+    def _end(self, context):
+        """Close generator, timer, progress and export contexts."""
+        self._pieces.close()
+        if self._timer:
+            wm = context.window_manager
+            wm.event_timer_remove(self._timer)
+            wm.progress_end()
+            self._timer = None
+        self._contexts.close()
+        clear_instances() # of the exported elements
+
+    def _cancel(self, context, level, msg):
+        """End the modal export, discard the temporary files."""
+        self._end(context)
+        self._out_file.discard()
+        if self._ge1_writer: self._ge1_writer.discard()
+        self.report({level}, msg)
+        return {'CANCELLED'}
+
+    def _finish(self, context):
+        """Replace the FDS file with the complete temporary file, save profile, wait for GE1 file, end the modal export."""
+        try: self._out_file.commit()
+        except IOError: return self._cancel(context, "ERROR", "FDS file not writable, cannot export")
+        msg = "FDS case exported" + self._get_profile_msg(self._filepath)
+        self._end(context)
+        if self._ge1_writer and not self._ge1_writer.commit():
+            self.report({"ERROR"}, "GE1 file not writable, cannot export")
+            return {'CANCELLED'}
+        DEBUG and print("BFDS: export_OT_fds_case_modal: End.")
+        self.report({"INFO"}, msg)
         return {'FINISHED'}
 
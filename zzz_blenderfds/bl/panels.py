@@ -2,6 +2,8 @@
 
 from bpy.types import Panel
 
+from ..types import get_instance
+
 from ..fds.lang import SN_HEAD, SN_TIME, SN_DUMP, SN_MISC, SN_REAC, OP_SURF_ID # TODO migrate to new search [" "]
 
 ### Scene panels
@@ -18,13 +20,13 @@ class SCENE_PT_BF():
     def draw_header(self, context):
         layout = self.layout
         element = context.scene
-        self.bl_label = self.bf_namelist(element).draw_header(context, layout)
+        self.bl_label = get_instance(self.bf_namelist, element).draw_header(context, layout)
         
     def draw(self, context):
         layout = self.layout
         element = context.scene
         # Panel
-        self.bf_namelist(element).draw(context, layout)
+        get_instance(self.bf_namelist, element).draw(context, layout)
         
 class SCENE_PT_BF_HEAD(SCENE_PT_BF, Panel):
     bl_idname = "SCENE_PT_BF_HEAD"
@@ -37,7 +39,7 @@ class SCENE_PT_BF_HEAD(SCENE_PT_BF, Panel):
         w = context.window_manager.windows[0]
         w.cursor_modal_restore()
         # Panel
-        self.bf_namelist(element).draw(context, layout)
+        get_instance(self.bf_namelist, element).draw(context, layout)
         # Other operators
         row = layout.row()
         row.operator("scene.bf_show_fds_code", text="Show FDS Code")
@@ -1,6 +1,7 @@
 """BlenderFDS, fds language"""
 
 import re, os.path
+import numpy as np
 
 import bpy
 from bpy.types import Scene, Object, Material
@@ -8,9 +9,9 @@ from bpy.props import *
 
 from ..types import *
 from .. import geometry
-from . import tables, mesh
+from . import tables, mesh, obst
 
-from .. import config
+from .. import config, profiler
 
 DEBUG = False
 
@@ -166,6 +167,51 @@ class OP_XB_voxel_size(BFNoAutoUIMod, BFNoAutoExportMod, BFProp):
     }
     # unit = "LENGTH", # correction for scale_length needed before exporting!
 
+@subscribe
+class OP_XB_voxel_engine(BFNoAutoUIMod, BFNoAutoExportMod, BFProp):
+    label = "Engine"
+    description = "Engine for object voxelization/pixelization"
+    bpy_type = Object
+    bpy_idname = "bf_xb_voxel_engine"
+    bpy_prop = EnumProperty
+    bpy_other =  {
+        "items": (
+            ("REMESH", "Remesh", "Use Blender Remesh modifier, resolution is limited", 100),
+            ("SCANLINE", "Scanline", "Use scanline on exact resolution, object shall be manifold", 200),
+            ("TILED", "Tiled", "Use scanline one tile after another, for very large manifold objects, re-voxelize edited tiles only", 300),
+        ),
+        "update": update_bf_xb_voxel_size,
+        "default": "REMESH",
+    }
+
+@subscribe
+class OP_XB_voxel_merge(BFNoAutoUIMod, BFNoAutoExportMod, BFProp):
+    label = "Merge"
+    description = "Strategy for merging voxels/pixels in boxes"
+    bpy_type = Object
+    bpy_idname = "bf_xb_voxel_merge"
+    bpy_prop = EnumProperty
+    bpy_other =  {
+        "items": (
+            ("GROW", "Grow", "Grow boxes along axes, fast", 100),
+            ("GREEDY", "Greedy", "Merge in maximal boxes, less boxes", 200),
+        ),
+        "update": update_bf_xb_voxel_size,
+        "default": "GROW",
+    }
+
+@subscribe
+class OP_XB_faces_merge(BFNoAutoUIMod, BFNoAutoExportMod, BFProp):
+    label = "Merge Faces"
+    description = "Merge adjacent coplanar faces in larger rectangles, less XBs"
+    bpy_type = Object
+    bpy_idname = "bf_xb_faces_merge"
+    bpy_prop = BoolProperty
+    bpy_other =  {
+        "update": update_bf_xb_voxel_size,
+        "default": False,
+    }
+
 @subscribe
 class SP_default_voxel_size(BFNoAutoExportMod, BFProp):
     label = "Default Resolution"
@@ -183,6 +229,94 @@ class SP_default_voxel_size(BFNoAutoExportMod, BFProp):
     }
     # unit = "LENGTH", # correction for scale_length needed before exporting!
 
+@subscribe
+class SP_voxel_cache_file(BFNoAutoExportMod, BFProp):
+    label = "Save Voxel Cache"
+    description = "Save voxelization cache in a file next to the .blend file, for faster exports"
+    bpy_type = Scene
+    bpy_idname = "bf_voxel_cache_file"
+    bpy_prop = BoolProperty
+    bpy_other =  {
+        "default": False,
+    }
+
+@subscribe
+class SP_voxel_parallel(BFNoAutoExportMod, BFProp):
+    label = "Parallel Voxelization"
+    description = "Voxelize objects in parallel processes before exporting (Linux only)"
+    bpy_type = Scene
+    bpy_idname = "bf_voxel_parallel"
+    bpy_prop = BoolProperty
+    bpy_other =  {
+        "default": False,
+    }
+
+    def _draw_body(self, context, layout):
+        row = layout.row()
+        row.enabled = geometry.voxel_cache.is_parallel_available # forked processes, Linux only
+        row.prop(self.element, self.bpy_idname, text=self.label)
+
+@subscribe
+class SP_export_mult(BFNoAutoExportMod, BFProp):
+    label = "Use MULT"
+    description = "Export identical objects on a regular lattice as a single namelist with MULT"
+    bpy_type = Scene
+    bpy_idname = "bf_export_mult"
+    bpy_prop = BoolProperty
+    bpy_other =  {
+        "default": False,
+    }
+
+@subscribe
+class SP_export_obst_merge(BFNoAutoExportMod, BFProp):
+    label = "Merge OBSTs"
+    description = "Merge touching OBSTs with the same parameters (SURF_ID, ...) in larger ones"
+    bpy_type = Scene
+    bpy_idname = "bf_export_obst_merge"
+    bpy_prop = BoolProperty
+    bpy_other =  {
+        "default": False,
+    }
+
+@subscribe
+class SP_export_profile(BFNoAutoExportMod, BFProp):
+    label = "Profile Export"
+    description = "Write the export timing profile of each object in JSON and CSV files next to the FDS file"
+    bpy_type = Scene
+    bpy_idname = "bf_export_profile"
+    bpy_prop = BoolProperty
+    bpy_other =  {
+        "default": False,
+    }
+
+# Bulk formatting of coordinates
+# All the coordinates of a multi XB or XYZ namelist are formatted at once,
+# by a printf-style operation on the line template repeated for all lines, then split.
+# The ID suffix is built from the coordinates of the axes selected by bf_id_suffix.
+
+id_suffix_axes = {
+    "IDX": (0,), "IDY": (1,), "IDZ": (2,),
+    "IDXY": (0, 1), "IDXZ": (0, 2), "IDYZ": (1, 2), "IDXYZ": (0, 1, 2),
+}
+
+xb_axis_columns = 0, 2, 4 # x0, y0, z0 columns of XB
+xyz_axis_columns = 0, 1, 2 # x, y, z columns of XYZ
+
+def format_coos(label, coos, axis_columns, name=None, id_suffix="IDI") -> "['label=...', ...]":
+    """Format (n, k) array of coordinates in FDS notation, with ID if name, in one batched operation."""
+    n, k = coos.shape
+    template = "{}={}".format(label, ",".join(("%.3f",) * k))
+    if name is None: values = coos
+    elif id_suffix == "IDI":
+        template = "ID='{}_%d'\n      {}".format(name.replace("%", "%%"), template)
+        values = np.column_stack((np.arange(n), coos))
+    else:
+        columns = [axis_columns[axis] for axis in id_suffix_axes[id_suffix]]
+        template = "ID='{}{}'\n      {}".format(name.replace("%", "%%"), "%+.3f" * len(columns), template)
+        values = np.column_stack((coos[:,columns], coos))
+    lines = ((template + "\0") * n) % tuple(values.ravel().tolist())
+    return lines.split("\0")[:-1]
+
 # XB
 
 def update_bf_xb(self, context):
@@ -197,7 +331,7 @@ def update_bf_xb(self, context):
 @subscribe
 class OP_XB(BFXBProp):
 #    bf_props = OP_XB_precise_bbox, OP_XB_custom_voxel, OP_XB_voxel_size # TODO not ready for prime time
-    bf_props = OP_XB_custom_voxel, OP_XB_voxel_size
+    bf_props = OP_XB_custom_voxel, OP_XB_voxel_size, OP_XB_voxel_engine, OP_XB_voxel_merge, OP_XB_faces_merge
     bpy_other = {
         "update": update_bf_xb,
         "items": (
@@ -214,6 +348,11 @@ class OP_XB(BFXBProp):
 
     def _draw_body(self, context, layout):
         super()._draw_body(context, layout)
+        if self.element.bf_xb == "FACES":
+            # Draw FACES properties
+            row = layout.row()
+            row.prop(self.element, "bf_xb_faces_merge")
+            return
         if not self.element.bf_xb in ("VOXELS", "PIXELS"): return
         # Draw VOXELS, PIXELS properties
         row = layout.row()
@@ -223,63 +362,30 @@ class OP_XB(BFXBProp):
         row = layout_custom.row(align=True)
         row.prop(self.element, "bf_xb_voxel_size")
         layout_custom.active = self.element.bf_xb_custom_voxel
+        row = layout.row()
+        row.prop(self.element, "bf_xb_voxel_engine", expand=True)
+        row = layout.row()
+        row.prop(self.element, "bf_xb_voxel_merge", expand=True)
 
-    def _format_xb(self, value):
-        return "XB={0[0]:.3f},{0[1]:.3f},{0[2]:.3f},{0[3]:.3f},{0[4]:.3f},{0[5]:.3f}".format(value)
-
-    def _format_xb_idi(self, value, name, i):
-        return "ID='{1}_{2}'\n      XB={0[0]:.3f},{0[1]:.3f},{0[2]:.3f},{0[3]:.3f},{0[4]:.3f},{0[5]:.3f}".format(value, name, i)
-
-    def _format_xb_idx(self, value, name, i):
-        return "ID='{1}{0[0]:+.3f}'\n      XB={0[0]:.3f},{0[1]:.3f},{0[2]:.3f},{0[3]:.3f},{0[4]:.3f},{0[5]:.3f}".format(value, name)
-
-    def _format_xb_idy(self, value, name, i):
-        return "ID='{1}{0[2]:+.3f}'\n      XB={0[0]:.3f},{0[1]:.3f},{0[2]:.3f},{0[3]:.3f},{0[4]:.3f},{0[5]:.3f}".format(value, name)
-
-    def _format_xb_idz(self, value, name, i):
-        return "ID='{1}{0[4]:+.3f}'\n      XB={0[0]:.3f},{0[1]:.3f},{0[2]:.3f},{0[3]:.3f},{0[4]:.3f},{0[5]:.3f}".format(value, name)
-
-    def _format_xb_idxy(self, value, name, i):
-        return "ID='{1}{0[0]:+.3f}{0[2]:+.3f}'\n      XB={0[0]:.3f},{0[1]:.3f},{0[2]:.3f},{0[3]:.3f},{0[4]:.3f},{0[5]:.3f}".format(value, name)
-
-    def _format_xb_idxz(self, value, name, i):
-        return "ID='{1}{0[0]:+.3f}{0[4]:+.3f}'\n      XB={0[0]:.3f},{0[1]:.3f},{0[2]:.3f},{0[3]:.3f},{0[4]:.3f},{0[5]:.3f}".format(value, name)
-
-    def _format_xb_idyz(self, value, name, i):
-        return "ID='{1}{0[2]:+.3f}{0[4]:+.3f}'\n      XB={0[0]:.3f},{0[1]:.3f},{0[2]:.3f},{0[3]:.3f},{0[4]:.3f},{0[5]:.3f}".format(value, name)
-
-    def _format_xb_idxyz(self, value, name, i):
-        return "ID='{1}{0[0]:+.3f}{0[2]:+.3f}{0[4]:+.3f}'\n      XB={0[0]:.3f},{0[1]:.3f},{0[2]:.3f},{0[3]:.3f},{0[4]:.3f},{0[5]:.3f}".format(value, name)
-    
     def to_fds(self, context):
         # Check
         self.check(context)
         # Init
         bf_xb = self.element.bf_xb
         if bf_xb not in self.allowed_items: return None
-        # Get coordinates
-        xbs, msg = geometry.to_fds.ob_to_xbs(context, self.element)
+        # Get coordinates, of all coalesced OBSTs if any
+        group = obst.get(self.element)
+        if group: xbs, msg = group[1], "Coalesced from {} OBSTs: {}".format(len(group[2]), ", ".join(group[2]))
+        else: xbs, msg = geometry.to_fds.ob_to_xbs(context, self.element)
         if msg: self.infos.append(msg)
         if not xbs: return None     
+        profiler.add(self.element.name, "n_xbs", len(xbs))
         # Correct for scale_lenght
         scale_length = context.scene.unit_settings.scale_length
-        xbs = [[coo * scale_length for coo in xb] for xb in xbs]
+        xbs = np.array(xbs, dtype=np.float64) * scale_length
         # Prepare
-        if len(xbs) == 1:
-            return self._format_xb(xbs[0])
-        else:
-            _format_xb = {
-                "IDI" :   self._format_xb_idi,
-                "IDX" :   self._format_xb_idx,
-                "IDY" :   self._format_xb_idy,
-                "IDZ" :   self._format_xb_idz,
-                "IDXY" :  self._format_xb_idxy,
-                "IDXZ" :  self._format_xb_idxz,
-                "IDYZ" :  self._format_xb_idyz,
-                "IDXYZ" : self._format_xb_idxyz,
-            }[self.element.bf_id_suffix]
-            name = self.element.name
-            return [_format_xb(xb, name, i) for i, xb in enumerate(xbs)]
+        if len(xbs) == 1: return format_coos("XB", xbs, xb_axis_columns)[0]
+        return format_coos("XB", xbs, xb_axis_columns, self.element.name, self.element.bf_id_suffix)
 
     def from_fds(self, context, value):
         try:
@@ -334,33 +440,6 @@ class OP_XYZ(BFXYZProp):
 
     allowed_items = "NONE", "CENTER", "VERTICES"
 
-    def _format_xyz(self, value):
-        return "XYZ={0[0]:.3f},{0[1]:.3f},{0[2]:.3f}".format(value)
-
-    def _format_xyz_idi(self, value, name, i):
-        return "ID='{1}_{2}'\n      XYZ={0[0]:.3f},{0[1]:.3f},{0[2]:.3f}".format(value, name, i)
-
-    def _format_xyz_idx(self, value, name, i):
-        return "ID='{1}{0[0]:+.3f}'\n      XYZ={0[0]:.3f},{0[1]:.3f},{0[2]:.3f}".format(value, name)
-
-    def _format_xyz_idy(self, value, name, i):
-        return "ID='{1}{0[1]:+.3f}'\n      XYZ={0[0]:.3f},{0[1]:.3f},{0[2]:.3f}".format(value, name)
-
-    def _format_xyz_idz(self, value, name, i):
-        return "ID='{1}{0[2]:+.3f}'\n      XYZ={0[0]:.3f},{0[1]:.3f},{0[2]:.3f}".format(value, name)
-
-    def _format_xyz_idxy(self, value, name, i):
-        return "ID='{1}{0[0]:+.3f}{0[1]:+.3f}'\n      XYZ={0[0]:.3f},{0[1]:.3f},{0[2]:.3f}".format(value, name)
-
-    def _format_xyz_idxz(self, value, name, i):
-        return "ID='{1}{0[0]:+.3f}{0[2]:+.3f}'\n      XYZ={0[0]:.3f},{0[1]:.3f},{0[2]:.3f}".format(value, name)
-
-    def _format_xyz_idyz(self, value, name, i):
-        return "ID='{1}{0[1]:+.3f}{0[2]:+.3f}'\n      XYZ={0[0]:.3f},{0[1]:.3f},{0[2]:.3f}".format(value, name)
-
-    def _format_xyz_idxyz(self, value, name, i):
-        return "ID='{1}{0[0]:+.3f}{0[1]:+.3f}{0[2]:+.3f}'\n      XYZ={0[0]:.3f},{0[1]:.3f},{0[2]:.3f}".format(value, name)
-
     def to_fds(self, context):
         # Check
         self.check(context)
@@ -373,23 +452,10 @@ class OP_XYZ(BFXYZProp):
         if not xyzs: return None
         # Correct for scale_lenght
         scale_length = context.scene.unit_settings.scale_length
-        xyzs = [[coo * scale_length for coo in xyz] for xyz in xyzs]
+        xyzs = np.array(xyzs, dtype=np.float64) * scale_length
         # Prepare
-        if len(xyzs) == 1:
-            return self._format_xyz(xyzs[0])
-        else:
-            _format_xyz = {
-                "IDI" :   self._format_xyz_idi,
-                "IDX" :   self._format_xyz_idx,
-                "IDY" :   self._format_xyz_idy,
-                "IDZ" :   self._format_xyz_idz,
-                "IDXY" :  self._format_xyz_idxy,
-                "IDXZ" :  self._format_xyz_idxz,
-                "IDYZ" :  self._format_xyz_idyz,
-                "IDXYZ" : self._format_xyz_idxyz,
-            }[self.element.bf_id_suffix]
-            name = self.element.name
-            return [_format_xyz(xyz, name, i) for i, xyz in enumerate(xyzs)]
+        if len(xyzs) == 1: return format_coos("XYZ", xyzs, xyz_axis_columns)[0]
+        return format_coos("XYZ", xyzs, xyz_axis_columns, self.element.name, self.element.bf_id_suffix)
 
     def from_fds(self, context, value):
         try:
@@ -589,7 +655,7 @@ class SN_HEAD(BFNamelist):
     enum_id = 3001
     fds_label = "HEAD"
     bpy_type = Scene
-    bf_props = SP_HEAD_CHID, SP_HEAD_TITLE, SP_HEAD_directory, SP_default_voxel_size, SP_HEAD_free_text
+    bf_props = SP_HEAD_CHID, SP_HEAD_TITLE, SP_HEAD_directory, SP_default_voxel_size, SP_voxel_cache_file, SP_voxel_parallel, SP_export_mult, SP_export_obst_merge, SP_export_profile, SP_HEAD_free_text
 
 # TIME
 
@@ -0,0 +1,125 @@
+"""BlenderFDS, FDS MULT routines"""
+
+import numpy as np
+from contextlib import contextmanager
+
+from ..exceptions import BFException
+from ..geometry.geom_utils import epsilon
+
+DEBUG = False
+
+# Identical objects are exported as a single namelist multiplied by an FDS MULT,
+# when they share the same mesh datablock, the same exported parameters (except ID and XB),
+# when they are translated copies of the base object (same rotation and scale),
+# and when their locations form a full regular lattice.
+# Voxels of the scanline and tiled engines and pixels are aligned to global multiples of voxel_size,
+# so a copy is voxelized as the translated base only if its offset is a multiple of voxel_size.
+# The index is built once at the beginning of the export, while the MULT context is active:
+# the base object (at the lattice origin) exports its namelist with MULT_ID,
+# its copies are not exported.
+
+fds_labels = "OBST", "HOLE", "VENT" # Namelists accepting MULT_ID with XB
+bf_xbs = "BBOX", "VOXELS", "FACES", "PIXELS" # Geometries exported by XB
+grid_voxel_engines = "SCANLINE", "TILED" # Engines aligned to the global grid, like PIXELS
+
+_index = None # {ob.name: (base ob.name, mult_id, mult body), ...}, None if no MULT context is active
+
+@contextmanager
+def mult_context(context):
+    """Activate the MULT context, if requested: identical objects are exported as MULTs, till the end of the context."""
+    global _index
+    if not context.scene.bf_export_mult or _index is not None: # not requested or already active, eg. nested
+        yield
+        return
+    _index = get_index(context)
+    try: yield
+    finally: _index = None
+
+def get(ob) -> "(base ob.name, mult_id, mult body) or None":
+    """Get ob MULT, if any."""
+    return _index and _index.get(ob.name)
+
+def is_instance(ob) -> "bool":
+    """Check if ob is a copy exported by the MULT of its base object."""
+    mult = get(ob)
+    return bool(mult) and mult[0] != ob.name
+
+def _get_signature(context, ob) -> "tuple or None":
+    """Get ob signature, equal for objects exporting the same namelist except for location, or None."""
+    if not ob.bf_export or ob.type != "MESH" or ob.modifiers: return None
+    if ob.bf_xb not in bf_xbs or ob.bf_xyz != "NONE" or ob.bf_pb != "NONE": return None
+    bf_namelist = ob.bf_namelist
+    if not bf_namelist or bf_namelist.fds_label not in fds_labels or not bf_namelist.get_exported(context): return None
+    try: params = bf_namelist.get_other_params(context) # except ID and XB
+    except BFException: return None # the export is going to report the error
+    return (
+        ob.data.name, ob.bf_namelist_cls, params,
+        ob.bf_xb, ob.bf_xb_custom_voxel, ob.bf_xb_voxel_size, ob.bf_xb_voxel_engine, ob.bf_xb_voxel_merge, ob.bf_xb_faces_merge,
+        tuple(round(co, 6) for row in ob.matrix_world.to_3x3() for co in row),
+    )
+
+def _get_grid_step(context, ob) -> "voxel_size or None":
+    """Get the step of the global grid ob geometry is aligned to, None if not aligned."""
+    if ob.bf_xb == "PIXELS" or (ob.bf_xb == "VOXELS" and ob.bf_xb_voxel_engine in grid_voxel_engines):
+        if ob.bf_xb_custom_voxel: return ob.bf_xb_voxel_size
+        return context.scene.bf_default_voxel_size
+
+def _is_translated(obs, base_ob, locations, step) -> "bool":
+    """Check if obs are copies of base_ob translated by multiples of step (if any)."""
+    base_matrix = np.array(base_ob.matrix_world.to_3x3(), dtype=np.float64)
+    for ob in obs:
+        if np.abs(np.array(ob.matrix_world.to_3x3(), dtype=np.float64) - base_matrix).max() > 1E-6: return False # rotated or scaled
+    if not step: return True
+    offsets = (locations - np.array(base_ob.matrix_world.translation, dtype=np.float64)) / step
+    return bool(np.all(np.abs(offsets - np.round(offsets)) * step < epsilon))
+
+def get_lattice(locations) -> "((dx, nx), (dy, ny), (dz, nz)) or None":
+    """Get steps and counts of the full regular lattice of locations, or None."""
+    qlocations = np.round(locations / epsilon).astype(np.int64)
+    if len(set(map(tuple, qlocations.tolist()))) != len(locations): return None # overlapping copies
+    lattice, n_nodes = list(), 1
+    for axis in range(3):
+        qcoos = np.unique(qlocations[:,axis])
+        n = len(qcoos)
+        if n > 1:
+            qsteps = np.diff(qcoos)
+            if np.any(np.abs(qsteps - qsteps[0]) > 1): return None # not regular
+            coos = locations[:,axis]
+            lattice.append(((coos.max() - coos.min()) / (n - 1), n))
+        else: lattice.append((0., 1))
+        n_nodes *= n
+    if n_nodes != len(locations): return None # not full
+    return lattice
+
+def _format_mult(context, mult_id, lattice, base_name, n_copies) -> "str":
+    """Format MULT namelist in FDS notation."""
+    scale_length = context.scene.unit_settings.scale_length
+    params = ["ID='{}'".format(mult_id)]
+    for (step, n), label, upper in zip(lattice, ("DX", "DY", "DZ"), ("I_UPPER", "J_UPPER", "K_UPPER")):
+        if n > 1: params.append("{}={:.3f} {}={}".format(label, step * scale_length, upper, n - 1))
+    return "! MULT: {} copies of {}\n&MULT {} /\n".format(n_copies, base_name, " ".join(params))
+
+def get_index(context) -> "dict":
+    """Get the MULT index of the exported objects: {ob.name: (base ob.name, mult_id, mult body), ...}."""
+    # Group candidate objects by signature, objects with children are not grouped
+    parents = set(ob.parent.name for ob in context.scene.objects if ob.parent)
+    groups = dict()
+    for ob in context.scene.objects:
+        if ob.name in parents: continue
+        signature = _get_signature(context, ob)
+        if signature is not None: groups.setdefault(signature, list()).append(ob)
+    # Check the lattice of each group
+    index = dict()
+    for obs in groups.values():
+        if len(obs) < 2: continue
+        locations = np.array([ob.matrix_world.translation for ob in obs], dtype=np.float64)
+        lattice = get_lattice(locations)
+        if not lattice: continue
+        base_ob = obs[np.lexsort(locations.T[::-1])[0]] # lattice origin
+        if not _is_translated(obs, base_ob, locations, _get_grid_step(context, base_ob)): continue
+        mult_id = "{}_mult".format(base_ob.name)
+        mult = base_ob.name, mult_id, _format_mult(context, mult_id, lattice, base_ob.name, len(obs))
+        for ob in obs: index[ob.name] = mult
+        DEBUG and print("BFDS: mult.get_index:", mult_id, len(obs))
+    print("BFDS: mult.get_index: {} objects in {} MULTs".format(len(index), len(set(mult[1] for mult in index.values()))))
+    return index
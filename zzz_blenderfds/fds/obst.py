@@ -0,0 +1,87 @@
+"""BlenderFDS, FDS OBST routines"""
+
+import numpy as np
+from time import time
+from contextlib import contextmanager
+
+from ..exceptions import BFException
+from .. import geometry, profiler
+from . import mult
+
+DEBUG = False
+
+# Exported OBST objects with the same parameters (SURF_ID, THICKEN, ..., except ID and XB)
+# are coalesced: their XBs are collected and merged when they touch and line up,
+# eg. a wall modelled as 12 segments becomes a single OBST.
+# The groups are found once at the beginning of the export, while the OBST context is active,
+# by their parameters only. The XBs of a group are computed and merged lazily, during the export walk,
+# when one of its objects is first visited: so the export streams, shows progress and can be cancelled,
+# and the time spent on each object is profiled.
+# The first object of each group (by name) exports all merged XBs, the other objects are not exported.
+
+_index = None # {ob.name: (base ob.name, xbs, merged ob.names) or None, ...}, None if no OBST context is active
+_pending = None # {ob.name: (context, [ob, ...]), ...}, groups not merged yet
+
+@contextmanager
+def obst_context(context):
+    """Activate the OBST context, if requested: OBSTs are coalesced, till the end of the context."""
+    global _index, _pending
+    if not context.scene.bf_export_obst_merge or _index is not None: # not requested or already active, eg. nested
+        yield
+        return
+    _index, _pending = dict(), get_pending(context)
+    try: yield
+    finally: _index, _pending = None, None
+
+def get(ob) -> "(base ob.name, xbs, merged ob.names) or None":
+    """Get ob OBST group, if any, merging its xbs at the first request."""
+    if _index is None: return None
+    pending = _pending.get(ob.name)
+    if pending: _merge_group(*pending)
+    return _index.get(ob.name)
+
+def is_merged(ob) -> "bool":
+    """Check if ob is merged in the OBST exported by the base object of its group."""
+    group = get(ob)
+    return bool(group) and group[0] != ob.name
+
+def _get_signature(context, ob) -> "tuple or None":
+    """Get ob signature, equal for OBSTs exporting the same parameters except ID and XB, or None."""
+    if not ob.bf_export or ob.type != "MESH" or ob.bf_namelist_cls != "ON_OBST": return None
+    if mult.get(ob): return None # exported by a MULT
+    bf_namelist = ob.bf_namelist
+    if not bf_namelist or not bf_namelist.get_exported(context): return None
+    try: return bf_namelist.get_other_params(context)
+    except BFException: return None # the export is going to report the error
+
+def get_pending(context) -> "dict":
+    """Get the OBST groups of the exported objects, by signature only: {ob.name: (context, [ob, ...]), ...}."""
+    groups = dict()
+    for ob in context.scene.objects:
+        signature = _get_signature(context, ob)
+        if signature is not None: groups.setdefault(signature, list()).append(ob)
+    pending = dict()
+    for obs in groups.values():
+        if len(obs) < 2: continue
+        obs.sort(key=lambda k:k.name)
+        for ob in obs: pending[ob.name] = context, obs
+    print("BFDS: obst.get_pending: {} OBST objects in {} groups".format(len(pending), len(set(id(obs) for _, obs in pending.values()))))
+    return pending
+
+def _merge_group(context, obs) -> "None":
+    """Get and merge the xbs of a group of OBSTs, index them."""
+    xbs, names = list(), list()
+    for ob in obs:
+        _pending.pop(ob.name, None)
+        t0 = time()
+        try: ob_xbs, msg = geometry.to_fds.ob_to_xbs(context, ob)
+        except BFException: ob_xbs = None # the export is going to report the error
+        profiler.add(ob.name, "t_total", time() - t0)
+        if not ob_xbs: continue
+        xbs.extend(ob_xbs)
+        names.append(ob.name)
+    if len(names) < 2: return # nothing to coalesce, each object exports itself
+    xbs = geometry.geom_utils.merge_xbs(np.array(xbs, dtype=np.float64))
+    group = names[0], xbs.tolist(), names
+    for name in names: _index[name] = group
+    DEBUG and print("BFDS: obst._merge_group:", names[0], len(names), len(xbs))
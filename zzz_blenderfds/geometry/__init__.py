@@ -1,4 +1,4 @@
 """BlenderFDS, geometry library."""
 
-from . import from_fds, to_fds, to_ge1, geom_utils, tmp_objects
-# Not voxelize, used internally
+from . import from_fds, to_fds, to_ge1, geom_utils, tmp_objects, voxel_cache
+# Not voxelize, voxel_job and scanline, used internally
@@ -1,6 +1,8 @@
 """BlenderFDS, geometric utilities."""
 
-import bpy, bmesh
+import bpy, bmesh, hashlib
+import numpy as np
+from contextlib import contextmanager
 
 ### Epsilon definition for geometry module (used in float equality comparison and voxels overlapping)
 
@@ -15,6 +17,83 @@ def get_global_mesh(context, ob) -> "Mesh":
     me.transform(ob.matrix_world) # transform mesh in global coordinates, apply scale, rotation, and location
     return me
 
+# While a geometry context is active (eg. during an export), the global mesh arrays of each object
+# are evaluated once and shared by all consumers: XB, XYZ, PB, voxelization, GE1, area.
+# They are keyed by object, mesh datablock and transformation, not by mesh content:
+# Blender data must not be edited while the context is active, so it is never kept open
+# while the interface is live (eg. the modal export opens a new context at each step).
+# Their digest (eg. for the voxelization cache key) is also computed once.
+
+_evaluated = None # {key: (verts, faces, edges), ...}, None if no geometry context is active
+_digests = None # {key: digest, ...}
+
+@contextmanager
+def geometry_context():
+    """Activate the geometry context: each object global mesh is evaluated once, till the end of the context."""
+    global _evaluated, _digests
+    if _evaluated is not None: # already active, eg. nested
+        yield
+        return
+    _evaluated, _digests = dict(), dict()
+    try: yield
+    finally: _evaluated, _digests = None, None
+
+# Objects without modifiers and shape keys have the same mesh as ob.data:
+# it is read directly and its vertices transformed in global coordinates as an array,
+# no temporary mesh is created and removed.
+
+def is_mesh_evaluated(ob) -> "Bool":
+    """Check if object mesh is changed by modifiers or shape keys."""
+    return bool(ob.modifiers) or ob.data.shape_keys is not None
+
+def get_global_verts(context, ob) -> "verts":
+    """Return object mesh vertices modified and transformed in global coordinates, as numpy array."""
+    if _evaluated is not None: return get_global_mesh_arrays(context, ob)[0] # evaluate once
+    if is_mesh_evaluated(ob):
+        me = get_global_mesh(context, ob)
+        verts = get_mesh_verts(context, me)
+        bpy.data.meshes.remove(me)
+        return verts
+    return transform_verts(get_mesh_verts(context, ob.data), ob.matrix_world)
+
+def _get_evaluated_key(ob) -> "key":
+    """Get the key of object evaluated mesh in the geometry context."""
+    return ob.name, ob.data.name, tuple(co for row in ob.matrix_world for co in row)
+
+def get_global_mesh_digest(context, ob) -> "str":
+    """Return the digest of object mesh modified and transformed in global coordinates (vertices and tessfaces)."""
+    if _digests is not None:
+        key = _get_evaluated_key(ob)
+        digest = _digests.get(key)
+        if digest is not None: return digest # computed once
+    verts, faces, edges = get_global_mesh_arrays(context, ob)
+    h = hashlib.sha1()
+    h.update(verts.tobytes())
+    h.update(faces.tobytes())
+    digest = h.hexdigest()
+    if _digests is not None: _digests[key] = digest
+    return digest
+
+def get_global_mesh_arrays(context, ob) -> "verts, faces, edges":
+    """Return object mesh modified and transformed in global coordinates, as numpy arrays (read-only if shared)."""
+    if _evaluated is None: return _get_global_mesh_arrays(context, ob)
+    key = _get_evaluated_key(ob)
+    arrays = _evaluated.get(key)
+    if arrays is None:
+        arrays = _evaluated[key] = _get_global_mesh_arrays(context, ob)
+        for array in arrays: array.flags.writeable = False # shared by all consumers
+    return arrays
+
+def _get_global_mesh_arrays(context, ob) -> "verts, faces, edges":
+    """Evaluate object mesh modified and transformed in global coordinates, as numpy arrays."""
+    if is_mesh_evaluated(ob):
+        me = get_global_mesh(context, ob)
+        arrays = get_mesh_arrays(context, me)
+        bpy.data.meshes.remove(me)
+        return arrays
+    verts, faces, edges = get_mesh_arrays(context, ob.data)
+    return transform_verts(verts, ob.matrix_world), faces, edges
+
 def set_global_mesh(context, ob, me) -> "None":
     """Set object mesh from mesh in global coordinates."""
     try: me.transform(ob.matrix_world.inverted()) # transform global mesh to local coordinates, apply scale, rotation, and location
@@ -54,6 +133,44 @@ def get_tessfaces(context, me) -> "Mesh tessfaces":
     me.update(calc_tessface=True)
     return me.tessfaces
 
+def get_tessfaces_centers_normals(context, me) -> "centers, normals":
+    """Get bmesh tessfaces centers and normals, as numpy arrays of shape (n, 3)."""
+    me.update(calc_tessface=True)
+    n = len(me.tessfaces)
+    centers, normals = np.empty(n * 3, dtype=np.float32), np.empty(n * 3, dtype=np.float32)
+    me.tessfaces.foreach_get("center", centers) # bulk copy, no Python object per tessface
+    me.tessfaces.foreach_get("normal", normals)
+    return centers.reshape(n, 3).astype(np.float64), normals.reshape(n, 3).astype(np.float64)
+
+def get_mesh_verts(context, me) -> "verts":
+    """Get mesh vertices (n, 3) as numpy array."""
+    verts = np.empty(len(me.vertices) * 3, dtype=np.float32)
+    me.vertices.foreach_get("co", verts)
+    return verts.reshape(-1, 3).astype(np.float64)
+
+def get_mesh_arrays(context, me) -> "verts, faces, edges":
+    """Get mesh vertices (n, 3), tessfaces (m, 4) and edges (l, 2) as numpy arrays.
+    Tri tessfaces have their fourth vertex index set to -1."""
+    me.update(calc_tessface=True)
+    verts = get_mesh_verts(context, me)
+    faces = np.empty(len(me.tessfaces) * 4, dtype=np.int32)
+    me.tessfaces.foreach_get("vertices_raw", faces)
+    faces = faces.reshape(-1, 4)
+    faces[faces[:,3] == 0, 3] = -1 # a tri has 0 as fourth vertex index in vertices_raw
+    edges = np.empty(len(me.edges) * 2, dtype=np.int32)
+    me.edges.foreach_get("vertices", edges)
+    return verts, faces, edges.reshape(-1, 2)
+
+def transform_verts(verts, matrix) -> "verts":
+    """Transform vertices (n, 3) by 4x4 matrix, eg. from local to global coordinates."""
+    matrix = np.array(matrix, dtype=np.float64)
+    return np.dot(verts, matrix[:3,:3].T) + matrix[:3,3]
+
+def get_tris(faces) -> "tris":
+    """Split tessfaces (m, 4) in triangles (k, 3)."""
+    quads = faces[faces[:,3] >= 0]
+    return np.concatenate((faces[:,:3], quads[:,(0,2,3)]))
+
 def is_manifold(context, me) -> "Bool":
     """Check if mesh me is manifold."""
     bm = bmesh.new()
@@ -73,14 +190,10 @@ def is_manifold(context, me) -> "Bool":
 
 def get_global_bbox(context, ob) -> "x0, x1, y0, y1, z0, z1":
     """Get object’s bounding box in global coordinates and in xbs format."""
-    # Init
-    ob_tmp = get_new_object(context, context.scene, "tmp", get_global_mesh(context, ob), linked=False)
-    # Calc the bounding box in global coordinates, as it's global
-    bbox = get_bbox(ob_tmp)
-    # Clean up temporary object
-    bpy.data.objects.remove(ob_tmp)
-    # Return
-    return bbox
+    verts = get_global_verts(context, ob)
+    if not len(verts): return 0., 0., 0., 0., 0., 0.
+    (x0, y0, z0), (x1, y1, z1) = verts.min(axis=0).tolist(), verts.max(axis=0).tolist()
+    return x0, x1, y0, y1, z0, z1
 
 def get_bbox(ob) -> "x0, x1, y0, y1, z0, z1":
     """Get object’s bounding box in xbs format from an object."""
@@ -102,11 +215,10 @@ def get_global_dimensions(context, ob) -> "dx, dy, dz":
 
 def get_global_area(context, ob) -> "Float":
     """Get area of object in global coordinates."""
-    area = 0.
-    me_tmp = get_global_mesh(context, ob) # Apply modifiers and scales
-    for polygon in me_tmp.polygons: area += polygon.area
-    bpy.data.meshes.remove(me_tmp)
-    return area
+    verts, faces, edges = get_global_mesh_arrays(context, ob) # Apply modifiers and scales
+    tris = get_tris(faces)
+    p0, p1, p2 = verts[tris[:,0]], verts[tris[:,1]], verts[tris[:,2]]
+    return float(np.sqrt((np.cross(p1 - p0, p2 - p0) ** 2).sum(axis=1)).sum() / 2.)
 
 ### Working on position
 
@@ -124,3 +236,31 @@ def set_balanced_center_position(context, ob) -> "None":
 def move_xbs(xbs, movement) -> "None":
     """Move xbs of movement vector."""
     for xb in xbs: xb[:] = xb[0]+movement[0], xb[1]+movement[0], xb[2]+movement[1], xb[3]+movement[1], xb[4]+movement[2], xb[5]+movement[2]
+
+### Working on XBs
+
+# XBs are compared on coordinates quantized to epsilon: two boxes (or faces) with the same cross-section
+# that touch are joined along x, then y, then z, till nothing changes.
+# So a wall split in a grid of quads becomes a single face, and a wall built of segments a single box.
+
+def _join_xbs_along(xbs, qxbs, axis) -> "xbs, qxbs":
+    """Join touching xbs with the same cross-section along axis, in one pass."""
+    others = [i for i in range(6) if i // 2 != axis]
+    order = np.lexsort([qxbs[:,2*axis]] + [qxbs[:,i] for i in reversed(others)])
+    xbs, qxbs = xbs[order], qxbs[order]
+    # Runs of touching xbs with the same cross-section
+    is_joined = np.all(qxbs[1:,others] == qxbs[:-1,others], axis=1) & (qxbs[1:,2*axis] == qxbs[:-1,2*axis+1])
+    starts = np.flatnonzero(np.concatenate(([True], ~is_joined)))
+    ends = np.concatenate((starts[1:], [len(xbs)])) - 1
+    xbs_joined, qxbs_joined = xbs[starts], qxbs[starts]
+    xbs_joined[:,2*axis+1], qxbs_joined[:,2*axis+1] = xbs[ends,2*axis+1], qxbs[ends,2*axis+1]
+    return xbs_joined, qxbs_joined
+
+def merge_xbs(xbs) -> "xbs":
+    """Merge touching xbs array (boxes or faces) sharing a full face (or edge) in larger ones."""
+    qxbs = np.round(xbs / epsilon).astype(np.int64)
+    n = 0
+    while n != len(xbs):
+        n = len(xbs)
+        for axis in range(3): xbs, qxbs = _join_xbs_along(xbs, qxbs, axis)
+    return xbs
@@ -0,0 +1,164 @@
+"""BlenderFDS, scanline voxelization of triangle arrays.
+
+This module only depends on numpy, so it can be tested and benchmarked without Blender.
+"""
+
+import numpy as np
+
+# The voxel grid is aligned to global multiples of voxel_size,
+# voxel (i, j, k) spans from grid_origin + (i, j, k) * voxel_size to grid_origin + (i+1, j+1, k+1) * voxel_size.
+# Rays are cast along axis through the voxel centers of the other two axes (b, c).
+# Each ray crosses the closed surface of the object an even number of times:
+# at crossing 0 go into solid, at crossing 1 go out of solid, ... (ray parity).
+# Voxels whose centers are inside the solid are filled.
+
+# Rays are moved a little from the voxel centers, to avoid hitting triangle edges and vertices exactly,
+# as it happens very often with objects aligned to the voxel grid.
+ray_jitter = 1.1920929e-4, 2.3841858e-4 # fraction of voxel_size, along b and c
+
+max_candidates = 1 << 20 # Max number of (triangle, ray) candidates tested at once, limits peak memory
+
+tile_rays = 64 # Number of rays along each side of a tile, in tiled mode
+
+def get_grid(verts, voxel_size) -> "grid_origin, grid_shape":
+    """Get the voxel grid containing verts, aligned to global multiples of voxel_size."""
+    grid_origin = np.floor(verts.min(axis=0) / voxel_size) * voxel_size
+    grid_shape = np.maximum(np.ceil((verts.max(axis=0) - grid_origin) / voxel_size), 1).astype(np.int64)
+    return grid_origin, grid_shape
+
+def get_axes(axis) -> "b, c":
+    """Get the other two axes."""
+    return [i for i in range(3) if i != axis]
+
+def cast_rays(verts, tris, voxel_size, grid_origin, grid_shape, axis, tile=None) -> "js, ks, hits":
+    """Cast rays along axis through the voxel grid (or its tile only), return ray int coordinates and sorted hit coordinates."""
+    b, c = get_axes(axis)
+    if tile is None: tile = 0, grid_shape[b], 0, grid_shape[c]
+    # Triangles vertices, skip triangles parallel to the rays
+    p0, p1, p2 = verts[tris[:,0]], verts[tris[:,1]], verts[tris[:,2]]
+    d = (p1[:,b] - p0[:,b]) * (p2[:,c] - p0[:,c]) - (p2[:,b] - p0[:,b]) * (p1[:,c] - p0[:,c])
+    is_good = np.abs(d) > 1E-12
+    p0, p1, p2, d = p0[is_good], p1[is_good], p2[is_good], d[is_good]
+    # Rays covered by each triangle bounding box
+    jb, jc = ray_jitter
+    lo, hi = np.minimum(np.minimum(p0, p1), p2), np.maximum(np.maximum(p0, p1), p2)
+    j0 = np.maximum(np.ceil((lo[:,b] - grid_origin[b]) / voxel_size - .5 - jb), tile[0]).astype(np.int64)
+    j1 = np.minimum(np.floor((hi[:,b] - grid_origin[b]) / voxel_size - .5 - jb), tile[1] - 1).astype(np.int64)
+    k0 = np.maximum(np.ceil((lo[:,c] - grid_origin[c]) / voxel_size - .5 - jc), tile[2]).astype(np.int64)
+    k1 = np.minimum(np.floor((hi[:,c] - grid_origin[c]) / voxel_size - .5 - jc), tile[3] - 1).astype(np.int64)
+    nj, nk = np.maximum(j1 - j0 + 1, 0), np.maximum(k1 - k0 + 1, 0)
+    counts = nj * nk
+    ends = np.cumsum(counts)
+    # Test candidates in chunks of triangles
+    js, ks, hits = list(), list(), list()
+    start = 0
+    while start < len(counts):
+        offset = start and ends[start-1] or 0
+        stop = max(int(np.searchsorted(ends, offset + max_candidates, side="right")), start + 1)
+        t = np.repeat(np.arange(start, stop), counts[start:stop]) # triangle of each candidate
+        start = stop
+        if not len(t): continue
+        local = offset + np.arange(len(t)) - (ends[t] - counts[t]) # candidate index in its triangle
+        j, k = j0[t] + local // nk[t], k0[t] + local % nk[t]
+        # Ray position
+        py = grid_origin[b] + (j + .5 + jb) * voxel_size
+        pz = grid_origin[c] + (k + .5 + jc) * voxel_size
+        # Barycentric coordinates of the ray in the triangle
+        a0, a1, a2 = p0[t], p1[t], p2[t]
+        w0 = ((a1[:,b] - py) * (a2[:,c] - pz) - (a2[:,b] - py) * (a1[:,c] - pz)) / d[t]
+        w1 = ((a2[:,b] - py) * (a0[:,c] - pz) - (a0[:,b] - py) * (a2[:,c] - pz)) / d[t]
+        w2 = 1. - w0 - w1
+        is_hit = (w0 >= 0.) & (w1 >= 0.) & (w2 >= 0.)
+        js.append(j[is_hit])
+        ks.append(k[is_hit])
+        hits.append((w0 * a0[:,axis] + w1 * a1[:,axis] + w2 * a2[:,axis])[is_hit])
+    if not js: return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    js, ks, hits = np.concatenate(js), np.concatenate(ks), np.concatenate(hits)
+    # Sort by ray, then hits along the ray
+    order = np.lexsort((hits, ks, js))
+    return js[order], ks[order], hits[order]
+
+def hits_to_boxes(js, ks, hits, voxel_size, grid_origin, axis) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1)":
+    """Transform sorted ray hits into minimal boxes, in floors format along axis."""
+    b, c = get_axes(axis)
+    # Split in rays, each ray should have an even number of hits
+    splits = np.flatnonzero((js[1:] != js[:-1]) | (ks[1:] != ks[:-1])) + 1
+    counts = np.diff(np.concatenate(([0], splits, [len(js)])))
+    if np.any(counts % 2): raise ValueError("BFDS: scanline.hits_to_boxes: odd number of hits, non-manifold object")
+    # Consecutive pairs of hits are solid intervals, fill the voxels with center inside
+    hits = hits.reshape(-1, 2)
+    i0 = np.ceil((hits[:,0] - grid_origin[axis]) / voxel_size - .5).astype(np.int64)
+    i1 = np.floor((hits[:,1] - grid_origin[axis]) / voxel_size - .5).astype(np.int64)
+    is_full = i0 <= i1
+    boxes = np.empty((np.count_nonzero(is_full), 6), dtype=np.int32)
+    boxes[:,2*axis], boxes[:,2*axis+1] = i0[is_full], i1[is_full] + 1 # floors
+    boxes[:,2*b], boxes[:,2*b+1] = js[::2][is_full], js[::2][is_full] # voxel location
+    boxes[:,2*c], boxes[:,2*c+1] = ks[::2][is_full], ks[::2][is_full]
+    return boxes
+
+# Flat triangles normal to axis are rasterized on the grid cross-section, with the same rays:
+# the pixels whose center is hit by any triangle are filled (no ray parity, flat faces are not closed).
+# Pixels are represented as minimal boxes one voxel thick along axis, between floors 0 and 1.
+
+def tris_to_pixels(verts, tris, voxel_size, axis) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1), origin":
+    """Rasterize flat triangles normal to axis into pixels, as minimal boxes in floors format along axis."""
+    b, c = get_axes(axis)
+    grid_origin, grid_shape = get_grid(verts, voxel_size)
+    js, ks, hits = cast_rays(verts, tris, voxel_size, grid_origin, grid_shape, axis)
+    # Hits are sorted by ray, keep one hit per ray
+    is_first = np.concatenate(([True], (js[1:] != js[:-1]) | (ks[1:] != ks[:-1])))[:len(js)]
+    boxes = np.zeros((np.count_nonzero(is_first), 6), dtype=np.int32)
+    boxes[:,2*axis+1] = 1 # floors
+    boxes[:,2*b], boxes[:,2*b+1] = js[is_first], js[is_first] # pixel location
+    boxes[:,2*c], boxes[:,2*c+1] = ks[is_first], ks[is_first]
+    return boxes, get_boxes_origin(voxel_size, grid_origin, axis)
+
+def get_boxes_origin(voxel_size, grid_origin, axis) -> "origin":
+    """Get origin of boxes in floors format along axis: floor 0 along axis, first voxel center along others."""
+    origin = [coo + voxel_size / 2. for coo in grid_origin.tolist()]
+    origin[axis] = grid_origin[axis].item()
+    return tuple(origin)
+
+def tris_to_boxes(verts, tris, voxel_size, axis) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1), origin":
+    """Voxelize triangles into minimal boxes, in floors format along axis."""
+    grid_origin, grid_shape = get_grid(verts, voxel_size)
+    js, ks, hits = cast_rays(verts, tris, voxel_size, grid_origin, grid_shape, axis)
+    boxes = hits_to_boxes(js, ks, hits, voxel_size, grid_origin, axis)
+    return boxes, get_boxes_origin(voxel_size, grid_origin, axis)
+
+# In tiled mode, the rays are grouped in square tiles of the grid cross-section.
+# The grid origin is the global origin and tiles are aligned to global multiples of tile_rays * voxel_size,
+# so box int coordinates and tiles are global: the same tile of an edited object is found again
+# by the next voxelization, and only the edited tiles need to be cast again.
+# Each tile is cast with the triangles crossing it only, and its boxes are yielded before casting the next one,
+# so peak memory is bounded by the tile size, not by the object size.
+
+def get_tiles(lo, hi, voxel_size, axis) -> "set of (tj, tk)":
+    """Get the tiles crossed by the bounding boxes from lo to hi (global coordinates, arrays of shape (n, 3))."""
+    b, c = get_axes(axis)
+    tlo = (np.floor(lo / voxel_size - .5).astype(np.int64)) // tile_rays
+    thi = (np.ceil(hi / voxel_size - .5).astype(np.int64)) // tile_rays
+    tiles = set()
+    for tj0, tj1, tk0, tk1 in zip(tlo[:,b].tolist(), thi[:,b].tolist(), tlo[:,c].tolist(), thi[:,c].tolist()):
+        tiles.update((tj, tk) for tj in range(tj0, tj1 + 1) for tk in range(tk0, tk1 + 1))
+    return tiles
+
+def tris_to_boxes_tiled(verts, tris, voxel_size, axis, tiles=None) -> "origin, iterator of (tile, boxes array)":
+    """Voxelize triangles into minimal boxes, in floors format along axis, one tile after another (all or requested)."""
+    b, c = get_axes(axis)
+    grid_origin = np.zeros(3)
+    if tiles is None: tiles = get_tiles(verts.min(axis=0)[None], verts.max(axis=0)[None], voxel_size, axis)
+    # Triangles bounding boxes, in ray int coordinates
+    tris_verts = verts[tris]
+    lo = np.floor(tris_verts.min(axis=1) / voxel_size - .5).astype(np.int64)
+    hi = np.ceil(tris_verts.max(axis=1) / voxel_size - .5).astype(np.int64)
+    def get_tiles_boxes():
+        for tj, tk in sorted(tiles):
+            tile = tj * tile_rays, (tj + 1) * tile_rays, tk * tile_rays, (tk + 1) * tile_rays
+            is_in = (hi[:,b] >= tile[0]) & (lo[:,b] < tile[1]) & (hi[:,c] >= tile[2]) & (lo[:,c] < tile[3])
+            if not np.any(is_in):
+                yield (tj, tk), np.empty((0, 6), dtype=np.int32)
+                continue
+            js, ks, hits = cast_rays(verts, tris[is_in], voxel_size, grid_origin, None, axis, tile)
+            yield (tj, tk), hits_to_boxes(js, ks, hits, voxel_size, grid_origin, axis)
+    return get_boxes_origin(voxel_size, grid_origin, axis), get_tiles_boxes()
@@ -1,9 +1,10 @@
 """BlenderFDS, translate Blender object geometry to FDS notation."""
 
-import bpy
+import numpy as np
 from time import time
 from .geom_utils import *
-from .voxelize import voxelize
+from .voxel_cache import cached_voxelize
+from .. import profiler
 
 DEBUG = False
 
@@ -18,21 +19,25 @@ def ob_to_xbs_voxels(context, ob) -> "((x0,x1,y0,y1,z0,z1,), ...), 'Message'":
     """Transform ob solid geometry in XBs notation (voxelization)."""
     print("BFDS: geometry.ob_to_xbs_voxels:", ob.name)
     t0 = time()
-    xbs, voxel_size, timing = voxelize(context, ob)
-    if not xbs: return None, "No voxel created"
+    (xbs, voxel_size, timing, n_boxes), is_cached = cached_voxelize(context, ob)
+    if not len(xbs): return None, "No voxel created"
     msg = "{0} voxels, resolution {1:.3f} m, in {2:.0f} s".format(len(xbs), voxel_size, time()-t0)
+    if is_cached: msg += " (cached)"
+    if ob.bf_xb_voxel_merge == "GREEDY": msg += ", merged from {0} boxes in {1:.1f} s".format(n_boxes, timing[2])
     if DEBUG: msg += " (s:{0[0]:.0f} 1f:{0[1]:.0f}, 2g:{0[2]:.0f}, 3g:{0[3]:.0f})".format(timing)
-    return xbs, msg
+    return xbs.tolist(), msg
 
 def ob_to_xbs_pixels(context, ob) -> "((x0,x1,y0,y1,z0,z0,), ...), 'Message'":
     """Transform ob flat geometry in XBs notation (flat voxelization)."""
     print("BFDS: geometry.ob_to_xbs_pixels:", ob.name)
     t0 = time()
-    xbs, voxel_size, timing = voxelize(context, ob, flat=True)
-    if not xbs: return None, "No pixel created"
+    (xbs, voxel_size, timing, n_boxes), is_cached = cached_voxelize(context, ob, flat=True)
+    if not len(xbs): return None, "No pixel created"
     msg = "{0} pixels, resolution {1:.3f} m, in {2:.0f} s".format(len(xbs), voxel_size, time()-t0)
+    if is_cached: msg += " (cached)"
+    if ob.bf_xb_voxel_merge == "GREEDY": msg += ", merged from {0} boxes in {1:.1f} s".format(n_boxes, timing[2])
     if DEBUG: msg += " (s:{0[0]:.0f} 1f:{0[1]:.0f}, 2g:{0[2]:.0f}, 3g:{0[3]:.0f})".format(timing)
-    return xbs, msg
+    return xbs.tolist(), msg
 
 def ob_to_xbs_bbox(context, ob) -> "((x0,x1,y0,y1,z0,z1,), ...), 'Message'":
     """Transform ob solid geometry in XBs notation (bounding box)."""
@@ -42,49 +47,45 @@ def ob_to_xbs_bbox(context, ob) -> "((x0,x1,y0,y1,z0,z1,), ...), 'Message'":
 def ob_to_xbs_faces(context, ob) -> "((x0,x1,y0,y1,z0,z0,), ...), 'Message'":
     """Transform ob faces in XBs notation (faces)."""
     # Init
-    result = list()
-    me = get_global_mesh(context, ob)
-    tessfaces = get_tessfaces(context, me)
-    # For each tessface...
-    for tessface in tessfaces:
-        vertices = [me.vertices[vertex] for vertex in tessface.vertices]
-        # Calc the bounding box in global coordinates
-        bbminx, bbminy, bbminz = vertices[0].co
-        bbmaxx, bbmaxy, bbmaxz = vertices[0].co
-        for vertex in vertices[1:]:
-            x, y, z = vertex.co
-            bbminx, bbminy, bbminz = min(bbminx, x), min(bbminy, y), min(bbminz, z)
-            bbmaxx, bbmaxy, bbmaxz = max(bbmaxx, x), max(bbmaxy, y), max(bbmaxz, z)
-        bbd = [(bbmaxx - bbminx, 2), (bbmaxy - bbminy, 1), (bbmaxz - bbminz, 0)]
-        bbd.sort()
-        if bbd[0][1] == 2: bbmaxx = bbminx = (bbminx+bbmaxx)/2
-        if bbd[0][1] == 1: bbmaxy = bbminy = (bbminy+bbmaxy)/2
-        if bbd[0][1] == 0: bbmaxz = bbminz = (bbminz+bbmaxz)/2
-        result.append((bbminx, bbmaxx, bbminy, bbmaxy, bbminz, bbmaxz,),)
-    result.sort()
-    # Clean up
-    bpy.data.meshes.remove(me)
+    verts, faces, edges = get_global_mesh_arrays(context, ob)
+    if not len(faces): return list(), None
+    # Calc the bounding box of each tessface in global coordinates, in one pass
+    counts = (faces >= 0).sum(axis=1) # 3 for tris, 4 for quads
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    coos = verts[faces[faces >= 0]] # tessfaces vertices, in order
+    bbmins = np.minimum.reduceat(coos, starts, axis=0)
+    bbmaxs = np.maximum.reduceat(coos, starts, axis=0)
+    # Flatten the thinnest dimension, in case of equal dimensions choose z, then y, then x
+    bbds = bbmaxs - bbmins
+    flat_axes = 2 - np.argmin(bbds[:,::-1], axis=1)
+    rows = np.arange(len(faces))
+    bbmins[rows,flat_axes] = bbmaxs[rows,flat_axes] = (bbmins[rows,flat_axes] + bbmaxs[rows,flat_axes]) / 2
+    result = np.empty((len(faces), 6))
+    result[:,0::2], result[:,1::2] = bbmins, bbmaxs
+    if ob.bf_xb_faces_merge: result = merge_xbs(result) # coplanar faces sharing an edge
+    result = _sort_rows(result).tolist()
     # Return
     msg = len(result) > 1 and "{0} faces".format(len(result)) or None
+    if msg and ob.bf_xb_faces_merge: msg += ", merged from {0}".format(len(faces))
     return result, msg
 
 def ob_to_xbs_edges(context, ob) -> "((x0,x1,y0,y1,z0,z1,), ...), 'Message'":
     """Transform ob faces in XBs notation (faces)."""
     # Init
-    result = list()
-    me = get_global_mesh(context, ob)
-    # For each edge...
-    for edge in me.edges:
-        pt0x, pt0y, pt0z = me.vertices[edge.vertices[0]].co
-        pt1x, pt1y, pt1z = me.vertices[edge.vertices[1]].co
-        result.append((pt0x, pt1x, pt0y, pt1y, pt0z, pt1z,),)
-    result.sort()
-    # Clean up
-    bpy.data.meshes.remove(me)
+    verts, faces, edges = get_global_mesh_arrays(context, ob)
+    # Get edges
+    result = np.empty((len(edges), 6))
+    result[:,0::2], result[:,1::2] = verts[edges[:,0]], verts[edges[:,1]]
+    result = _sort_rows(result).tolist()
     # Return
     msg = len(result) > 1 and "{0} edges".format(len(result)) or None
     return result, msg
 
+def _sort_rows(a) -> "array":
+    """Sort array rows, as a list of tuples is sorted."""
+    if not len(a): return a
+    return a[np.lexsort(a.T[::-1])]
+
 # Caller function (ob.bf_xb)
 
 choose_to_xbs = {
@@ -98,22 +99,18 @@ choose_to_xbs = {
 
 def ob_to_xbs(context, ob) -> "((x0,x1,y0,y1,z0,z0,), ...), 'Message'":
     """Transform Blender object geometry according to ob.bf_xb to FDS notation."""
-    return choose_to_xbs[ob.bf_xb](context, ob)
+    t0 = time()
+    result = choose_to_xbs[ob.bf_xb](context, ob)
+    profiler.add(ob.name, "t_geometry", time()-t0)
+    return result
 
 ### XYZ
 
 def ob_to_xyzs_vertices(context, ob) -> "((x0,y0,z0,), ...), 'Message'":
     """Transform ob vertices in XYZs notation."""
     # Init
-    result = list()
-    me = get_global_mesh(context, ob)
-    # For each vertex...
-    for vertex in me.vertices:
-        pt0x, pt0y, pt0z = vertex.co
-        result.append((pt0x, pt0y, pt0z,),)
-    result.sort()
-    # Clean up
-    bpy.data.meshes.remove(me)
+    verts, faces, edges = get_global_mesh_arrays(context, ob)
+    result = _sort_rows(verts).tolist()
     # Return
     msg = len(result) > 1 and "{0} vertices".format(len(result)) or None
     return result, msg
@@ -132,7 +129,10 @@ choose_to_xyzs = {
 
 def ob_to_xyzs(context, ob):
     """Transform Blender object geometry according to ob.bf_xyz to FDS notation."""
-    return choose_to_xyzs[ob.bf_xyz](context, ob)
+    t0 = time()
+    result = choose_to_xyzs[ob.bf_xyz](context, ob)
+    profiler.add(ob.name, "t_geometry", time()-t0)
+    return result
 
 ### PB
 
@@ -161,4 +161,7 @@ choose_to_pbs = {
 
 def ob_to_pbs(context, ob):
     """Transform Blender object geometry according to ob.bf_pb to FDS notation."""
-    return choose_to_pbs[ob.bf_pb](context, ob)
+    t0 = time()
+    result = choose_to_pbs[ob.bf_pb](context, ob)
+    profiler.add(ob.name, "t_geometry", time()-t0)
+    return result
@@ -1,6 +1,7 @@
 """BlenderFDS, export geometry to ge1 cad file format."""
 
 import bpy
+import numpy as np
 
 from .geom_utils import *
 
@@ -23,8 +24,16 @@ from .geom_utils import *
 # 6.0 3.9 0.5 6.0 1.9 0.5 6.0 1.9 1.9 6.0 3.9 1.9 0
 # EOF
 
+# The GE1 data are got from Blender on the main thread (get_ge1_data),
+# then formatted without accessing Blender data (get_ge1_pieces), so formatting and writing
+# can run in a background thread while the FDS file is exported.
+
 def scene_to_ge1(context, scene):
     """Export scene geometry in FDS GE1 notation."""
+    return "".join(get_ge1_pieces(*get_ge1_data(context, scene)))
+
+def get_ge1_data(context, scene) -> "appearances, [(coos, appearance_index), ...]":
+    """Get scene GE1 appearances and faces coordinates, by object."""
     # Cursor
     w = context.window_manager.windows[0]
     w.cursor_modal_set("WAIT")
@@ -49,7 +58,7 @@ def scene_to_ge1(context, scene):
             alpha=.5,
         )
     )
-    # Get GE1 gefaces from objects
+    # Get GE1 faces from objects
     obs = (ob for ob in context.scene.objects if ob.type == "MESH"
         and not ob.hide_render  # hide some objects if requested
         and not ob.bf_is_tmp    # do not show temporary objects
@@ -57,27 +66,27 @@ def scene_to_ge1(context, scene):
         and ob.bf_namelist_cls in ("ON_OBST", "ON_VENT", "ON_HOLE") # show only some namelists
         and getattr(ob.active_material, "name", None) != "OPEN" # do not show open VENTs
     )
-    gefaces = list()
+    ge1_faces = list()
     for ob in obs:
-        me = get_global_mesh(context, ob)
-        tessfaces = get_tessfaces(context, me)
+        verts, faces, edges = get_global_mesh_arrays(context, ob)
         # Transform ob tessfaces in GE1 gefaces
         if ob.bf_namelist_cls == "ON_HOLE": active_material_name = "BF_HOLE"
         elif ob.active_material: active_material_name = ob.active_material.name
         else: active_material_name = "INERT"
-        appearance_index = str(ma_to_appearance.get(active_material_name, 0)) + "\n"
-        for tessface in tessfaces:
-            # Get tessface vertices: (x0, y0, z0), (x1, y1, z1), (x2, y2, z2), ... tri or quad
-            verts = list(me.vertices[vertex] for vertex in tessface.vertices)
-            # Transform tri in quad
-            if len(verts) == 3: verts.append(verts[-1])
-            # Unzip and format verts, append ref to appearance
-            items = ["{:.3f}".format(co) for vert in verts for co in vert.co]
-            items.append(appearance_index)
-            # Append GE1 face
-            gefaces.append(" ".join(items))
-    # Prepare GE1 file and return
-    ge1_file_a = "[APPEARANCE]\n{}\n{}".format(len(appearances), "".join(appearances))
-    ge1_file_f = "[FACES]\n{}\n{}".format(len(gefaces), "".join(gefaces))
+        appearance_index = ma_to_appearance.get(active_material_name, 0)
+        # Get tessfaces vertices: (x0, y0, z0), (x1, y1, z1), (x2, y2, z2), ... tri or quad
+        # Transform tri in quad, repeating its last vertex
+        faces = np.where(faces < 0, faces[:,2:3], faces)
+        ge1_faces.append((verts[faces].reshape(-1, 12), appearance_index))
     w.cursor_modal_restore()
-    return "".join((ge1_file_a, ge1_file_f))
+    return appearances, ge1_faces
+
+def get_ge1_pieces(appearances, ge1_faces):
+    """Format GE1 appearances and faces, yield text pieces. No Blender data is accessed."""
+    yield "[APPEARANCE]\n{}\n".format(len(appearances))
+    yield "".join(appearances)
+    yield "[FACES]\n{}\n".format(sum(len(coos) for coos, _ in ge1_faces))
+    for coos, appearance_index in ge1_faces:
+        # Format verts, append ref to appearance
+        geface = " ".join(["{:.3f}"] * 12 + [str(appearance_index) + "\n"])
+        yield "".join(geface.format(*items) for items in coos.tolist())
@@ -0,0 +1,160 @@
+"""BlenderFDS, cache of voxelization results."""
+
+import bpy, os, sys, hashlib, multiprocessing
+import numpy as np
+from collections import OrderedDict
+from time import time
+
+from ..types import BFException
+from .geom_utils import *
+from .voxelize import voxelize, get_voxelize_job, set_tiled_memory
+from .voxel_job import run_voxelize_job
+
+DEBUG = False
+
+# Voxelization results are cached by a key, that is the hash of all voxelization inputs:
+# the evaluated mesh vertices and tessfaces in global coordinates, the object matrix_world,
+# its modifier stack, voxel_size, flat flag, engine and merge strategy.
+# So an unchanged object is never voxelized twice, even if it is renamed or its namelist is changed.
+# The mesh digest is computed once in the geometry context, so prefetch and export share the same key computation.
+# The cache lives in memory, with LRU eviction, and optionally in a sidecar file next to the .blend file.
+
+max_size = 1024 # Max number of cached results in memory
+
+_cache = OrderedDict() # {key: (xbs array, voxel_size, timing, n_boxes), ...}, last used at the end
+_sidecar_filepath = None # sidecar file already loaded in _cache
+
+def get_key(context, ob, flat=False) -> "str":
+    """Get the cache key of ob voxelization."""
+    if ob.bf_xb_custom_voxel: voxel_size = ob.bf_xb_voxel_size
+    else: voxel_size = context.scene.bf_default_voxel_size
+    h = hashlib.sha1()
+    h.update(get_global_mesh_digest(context, ob).encode())
+    h.update(np.array(ob.matrix_world, dtype=np.float64).tobytes())
+    h.update(repr([(mo.type, mo.name, mo.show_render) for mo in ob.modifiers]).encode())
+    h.update(repr((voxel_size, flat, ob.bf_xb_voxel_engine, ob.bf_xb_voxel_merge)).encode())
+    return h.hexdigest()
+
+def get(key) -> "(xbs, voxel_size, timing, n_boxes) or None":
+    """Get cached result by key, or None."""
+    result = _cache.get(key)
+    if result is not None: _cache.move_to_end(key) # last used
+    return result
+
+def put(key, result) -> "None":
+    """Set cached result by key, evict least recently used results."""
+    _cache[key] = result
+    _cache.move_to_end(key)
+    while len(_cache) > max_size: _cache.popitem(last=False)
+
+def clear() -> "None":
+    """Clear the cache in memory."""
+    global _sidecar_filepath
+    _cache.clear()
+    _sidecar_filepath = None
+
+def cached_voxelize(context, ob, flat=False) -> "(xbs, voxel_size, timing, n_boxes), is_cached":
+    """Voxelize object, or get the result from cache."""
+    load_sidecar(context)
+    key = get_key(context, ob, flat)
+    result = get(key)
+    if result is not None:
+        DEBUG and print("BFDS: voxel_cache.cached_voxelize: cached:", ob.name)
+        return result, True
+    result = voxelize(context, ob, flat)
+    put(key, result)
+    return result, False
+
+### Parallel voxelization
+
+# Before exporting, the Blender dependent part of the voxelization of all objects is run on the main thread,
+# the pure computation part (binning, growing, xbs) is run by a pool of processes.
+# Results are put in the cache, so the following export finds them in its usual deterministic order.
+# The pool uses the "fork" start method, so no Blender module is imported again by the workers:
+# a "spawn" worker would import the addon package, that cannot be imported outside Blender.
+# The fork copies the whole Blender process, its GL context and threads included:
+# workers only run numpy code on the picklable jobs, never touch Blender data, and exit when done.
+# This is safe on Linux only: fork is not available on Windows, and not safe on macOS
+# (system frameworks are not fork safe), so parallel voxelization is only available on Linux.
+# If anything goes wrong, nothing is cached and the export voxelizes the objects one after another.
+# The prefetch is a generator, that yields after each job and while waiting for the pool,
+# so the modal export can show the interface and be cancelled (the pool is then terminated).
+
+step_time = .05 # s, waiting time for the pool between steps
+
+is_parallel_available = sys.platform.startswith("linux") and "fork" in multiprocessing.get_all_start_methods()
+
+def _try_run_voxelize_job(job) -> "(xbs, voxel_size, timing, n_boxes) or None, updated tiled memory or None":
+    """Run voxelize job in a worker, return None if impossible (the export is going to report the error)."""
+    try: return run_voxelize_job(job), job.get("memory") # the memory is updated in the worker copy of the job
+    except ValueError: return None, None
+
+def prefetch(context, obs):
+    """Voxelize not cached obs in parallel, and put the results in the cache, yield None at each step."""
+    if not is_parallel_available: return
+    # Get jobs on the main thread
+    load_sidecar(context)
+    keys, jobs = list(), list()
+    for ob in obs:
+        yield
+        flat = ob.bf_xb == "PIXELS"
+        key = get_key(context, ob, flat)
+        if key in _cache or key in keys: continue
+        try: jobs.append(get_voxelize_job(context, ob, flat))
+        except BFException: continue # the export is going to report the error
+        keys.append(key)
+    if len(jobs) < 2: return # no use
+    # Run jobs in a pool of processes
+    print("BFDS: voxel_cache.prefetch: {} objects".format(len(jobs)))
+    t0 = time()
+    try:
+        with multiprocessing.get_context("fork").Pool(min(len(jobs), os.cpu_count() or 1)) as pool:
+            async_results = pool.map_async(_try_run_voxelize_job, jobs, chunksize=1)
+            while not async_results.ready():
+                yield
+                async_results.wait(step_time)
+            results = async_results.get()
+    except Exception as err: # any failure of the pool
+        print("BFDS: voxel_cache.prefetch: pool failed, voxelizing serially:", err)
+        return
+    for key, job, (result, memory) in zip(keys, jobs, results):
+        if result is not None: put(key, result)
+        if memory is not None: set_tiled_memory(job["memory_key"], memory)
+    print("BFDS: voxel_cache.prefetch: done in {0:.1f} s".format(time()-t0))
+
+### Sidecar file
+
+def get_sidecar_filepath(context) -> "str or None":
+    """Get sidecar file path next to the .blend file, if requested and possible."""
+    if not context.scene.bf_voxel_cache_file or not bpy.data.filepath: return None
+    return "{}.bfcache.npz".format(os.path.splitext(bpy.data.filepath)[0])
+
+def load_sidecar(context) -> "None":
+    """Load sidecar file in the cache, once."""
+    global _sidecar_filepath
+    filepath = get_sidecar_filepath(context)
+    if not filepath or filepath == _sidecar_filepath: return
+    _sidecar_filepath = filepath
+    if not os.path.exists(filepath): return
+    print("BFDS: voxel_cache.load_sidecar:", filepath)
+    try:
+        with np.load(filepath) as data: # no allow_pickle, numpy < 1.10; only numeric arrays are saved
+            for name in data.files:
+                if not name.endswith("_xbs"): continue
+                key = name[:-4]
+                voxel_size, n_boxes, t0, t1, t2, t3 = data[key + "_meta"].tolist()
+                put(key, (data[name], voxel_size, (t0, t1, t2, t3), int(n_boxes)))
+    except (IOError, ValueError, KeyError) as err:
+        print("BFDS: voxel_cache.load_sidecar: cannot load:", err)
+
+def save_sidecar(context) -> "None":
+    """Save the cache in the sidecar file."""
+    filepath = get_sidecar_filepath(context)
+    if not filepath or not _cache: return
+    print("BFDS: voxel_cache.save_sidecar:", filepath)
+    arrays = dict()
+    for key, (xbs, voxel_size, timing, n_boxes) in _cache.items():
+        arrays[key + "_xbs"] = xbs
+        arrays[key + "_meta"] = np.array((voxel_size, n_boxes) + tuple(timing), dtype=np.float64)
+    try: np.savez(filepath, **arrays)
+    except IOError as err: print("BFDS: voxel_cache.save_sidecar: cannot save:", err)
@@ -0,0 +1,412 @@
+"""BlenderFDS, pure computation part of the voxelize algorithm.
+
+This module only depends on numpy, so it can run in another process,
+and be tested and benchmarked without Blender.
+"""
+
+import numpy as np
+from time import time
+
+try: from . import scanline
+except (ImportError, SystemError): import scanline # imported outside its package, eg. by a benchmark
+
+DEBUG = False
+
+epsilon = .001 # same as geom_utils.epsilon, that depends on Blender
+
+# The job is a picklable dict, got by voxelize.get_voxelize_job.
+
+def run_voxelize_job(job) -> "(xbs, voxel_size, timing, n_boxes)":
+    """Run the pure computation part of ob voxelization, raise ValueError if impossible."""
+    voxel_size = job["voxel_size"]
+    if job["engine"] == "TILED":
+        ## Build and merge boxes along 1st axis, one (edited) tile after another, then merge them across tile seams
+        boxes, origin, axes, timing, n_boxes = _tiled_scanline_to_boxes(job["verts"], job["tris"], voxel_size, job["merge"], job.get("memory"))
+        t5 = time(); t4 = t5 - timing[2] # merging time, already spent
+    else:
+        ## Build minimal boxes along 1st axis, using floors, with the chosen engine
+        if job["engine"] == "SCANLINE":
+            boxes, origin, axes, timing = _scanline_to_boxes(job["verts"], job["tris"], voxel_size)
+        elif job["engine"] == "RASTER":
+            boxes, origin, axes, timing = _raster_to_boxes(job["verts"], job["tris"], voxel_size, job["flat_axis"])
+        else:
+            boxes, origin, axes, timing = _remesh_to_boxes(job["centers"], job["normals"], voxel_size)
+
+        ## Merge boxes
+        n_boxes = len(boxes)
+        t4 = time()
+        if job["merge"] == "GREEDY":
+            # Merge boxes in maximal boxes
+            boxes = _merge_boxes_greedy(boxes, axes)
+            t5 = time()
+        else:
+            # Grow boxes along 2nd axis
+            boxes = _grow_boxes_along[axes[1]](boxes) # eg. _grow_boxes_along_y(boxes)
+            # Grow boxes along 3rd axis
+            t5 = time()
+            boxes = _grow_boxes_along[axes[2]](boxes) # eg. _grow_boxes_along_z(boxes)
+
+    ## Make xbs
+    # Transform grown boxes in xbs
+    t6 = time()
+    xbs = _boxes_to_xbs_along[axes[0]](boxes, voxel_size, origin) # eg. _x_boxes_to_xbs(boxes, ...)
+    # If requested, center xbs to original bbox
+    # if precise_bbox: move_xbs(xbs, calc_movement_from_bbox1_to_bbox0(bbox_bvox, bbox_avox))  # TODO not ready for prime time
+    # If flat, flatten xbs at flat_origin
+    if job["flat_origin"] is not None: xbs = _flatten_xbs_along[job["flat_axis"]](xbs, job["flat_origin"]) # eg. _z_flatten_xbs(xbs, ...)
+
+    ## Return
+    return xbs, voxel_size, (timing[0], timing[1], t5-t4, t6-t5), n_boxes # this is timing: sort, 1b, 2g (or merge), 3g
+
+def _remesh_to_boxes(centers, normals, voxel_size) -> "boxes, origin, axes, timing":
+    """Build minimal boxes along the 1st of axes from remeshed tessfaces."""
+    # Sort tessfaces centers by face normal: normal to x, to y, to z.
+    t1 = time()
+    x_tessfaces, y_tessfaces, z_tessfaces = _sort_tessfaces_by_normal(centers, normals)
+    # Choose fastest procedure: less tessfaces => less time required
+    # Better use the smallest collection first!
+    t2 = time()
+    choose = [
+        (len(x_tessfaces), x_tessfaces, _x_tessfaces_to_boxes, 0),
+        (len(y_tessfaces), y_tessfaces, _y_tessfaces_to_boxes, 1),
+        (len(z_tessfaces), z_tessfaces, _z_tessfaces_to_boxes, 2),
+    ]
+    choose.sort(key=lambda k:k[0]) # sort by len(tessfaces)
+    # Build minimal boxes along 1st axis, using floors
+    t3 = time()
+    boxes, origin = choose[0][2](choose[0][1], voxel_size) # eg. _x_tessfaces_to_boxes(x_tessfaces, voxel_size)
+    t4 = time()
+    # Return
+    return boxes, origin, [c[3] for c in choose], (t2-t1, t4-t3)
+
+def _scanline_to_boxes(verts, tris, voxel_size) -> "boxes, origin, axes, timing":
+    """Voxelize triangles with the scanline engine, build minimal boxes along the 1st of axes."""
+    # Choose fastest procedure: cast the rays along the largest dimension => less and longer rays
+    t1 = time()
+    dimensions = verts.max(axis=0) - verts.min(axis=0)
+    axes = sorted(range(3), key=lambda k:-dimensions[k])
+    # Build minimal boxes along 1st axis, using floors
+    t2 = time()
+    boxes, origin = scanline.tris_to_boxes(verts, tris, voxel_size, axes[0])
+    t3 = time()
+    # Return
+    return boxes, origin, axes, (t2-t1, t3-t2)
+
+# The tiled engine remembers, for each object, its triangles and the merged boxes of each tile.
+# At the next voxelization, new and removed triangles are found by their coordinates,
+# only the tiles crossed by them are cast and merged again, the other tiles boxes are reused.
+# So the time spent after an edit depends on the size of the edit, not on the size of the object.
+
+_tris_weights = np.random.RandomState(0).uniform(.5, 1.5, 9) # to get triangle keys from their coordinates
+
+def _is_in(keys, keys_other) -> "bool array":
+    """Check if each key is in keys_other."""
+    if not len(keys_other): return np.zeros(len(keys), dtype=bool)
+    keys_other = np.sort(keys_other)
+    i = np.minimum(np.searchsorted(keys_other, keys), len(keys_other) - 1)
+    return keys_other[i] == keys
+
+def _get_changed_tris(tris_coords, memory) -> "changed tris coords":
+    """Get coordinates of new and removed triangles, from memory."""
+    keys, keys_old = np.dot(tris_coords, _tris_weights), np.dot(memory["tris_coords"], _tris_weights)
+    is_new, is_removed = ~_is_in(keys, keys_old), ~_is_in(keys_old, keys)
+    return np.concatenate((tris_coords[is_new], memory["tris_coords"][is_removed]))
+
+def _tiled_scanline_to_boxes(verts, tris, voxel_size, merge, memory=None) -> "boxes, origin, axes, timing, n_boxes":
+    """Voxelize triangles with the scanline engine one tile after another, build merged boxes along the 1st of axes."""
+    t1 = time()
+    if memory is None: memory = dict()
+    tris_coords = verts[tris].reshape(-1, 9)
+    if memory.get("voxel_size") == voxel_size and memory.get("merge") == merge:
+        # Incremental: cast again the tiles crossed by changed triangles only
+        axes = memory["axes"]
+        changed = _get_changed_tris(tris_coords, memory).reshape(-1, 3, 3)
+        tiles = scanline.get_tiles(changed.min(axis=1), changed.max(axis=1), voxel_size, axes[0])
+    else:
+        # Choose fastest procedure: cast the rays along the largest dimension => less and longer rays
+        dimensions = verts.max(axis=0) - verts.min(axis=0)
+        axes = sorted(range(3), key=lambda k:-dimensions[k])
+        memory.clear()
+        memory.update({"voxel_size": voxel_size, "merge": merge, "axes": axes, "tiles": dict(), "tiles_greedy": dict(), "tiles_n_boxes": dict()})
+        tiles = None # all tiles
+    print("BFDS: _tiled_scanline_to_boxes: tiles:", tiles is None and "all" or len(tiles))
+    # Build minimal boxes of each tile and grow them (and merge them, if requested), only these boxes are kept
+    origin, tiles_boxes = scanline.tris_to_boxes_tiled(verts, tris, voxel_size, axes[0], tiles)
+    t_merge = 0.
+    for tile, tile_boxes in tiles_boxes:
+        if len(tile_boxes): memory["tiles_n_boxes"][tile] = len(tile_boxes)
+        else: memory["tiles_n_boxes"].pop(tile, None)
+        t2 = time()
+        for key, merged_boxes in (
+            ("tiles", _grow_boxes_along[axes[2]](_grow_boxes_along[axes[1]](tile_boxes))),
+            ("tiles_greedy", _get_greedy_boxes(tile_boxes, axes[0]) if merge == "GREEDY" and len(tile_boxes) else None),
+        ):
+            if merged_boxes is not None and len(merged_boxes): memory[key][tile] = merged_boxes
+            else: memory[key].pop(tile, None)
+        t_merge += time() - t2
+    memory["tris_coords"] = tris_coords # all tiles are updated
+    n_boxes = sum(memory["tiles_n_boxes"].values()) # of all tiles, not only the cast ones
+    # Join boxes across tile seams, keep greedy boxes if less than grown boxes
+    t3 = time()
+    boxes = _join_tiles_boxes(memory["tiles"], axes)
+    if merge == "GREEDY" and len(memory["tiles_greedy"]) == len(memory["tiles"]): # no grid too large
+        boxes_greedy = _join_tiles_boxes(memory["tiles_greedy"], axes)
+        if len(boxes_greedy) < len(boxes): boxes = boxes_greedy
+    t4 = time()
+    # Return
+    return boxes, origin, axes, (0., t3-t1-t_merge, t_merge, t4-t3), n_boxes
+
+def _join_tiles_boxes(tiles, axes) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1)":
+    """Join boxes of all tiles across tile seams."""
+    boxes = [np.empty((0, 6), dtype=np.int32)] + list(tiles.values())
+    boxes = _join_boxes_along(np.concatenate(boxes), axes[1])
+    return _join_boxes_along(boxes, axes[2])
+
+def _raster_to_boxes(verts, tris, voxel_size, flat_axis) -> "boxes, origin, axes, timing":
+    """Rasterize flat triangles on their axis plane, build minimal boxes one voxel thick along flat_axis."""
+    # Flat axis first, then grow along the largest dimension => less boxes
+    t1 = time()
+    dimensions = verts.max(axis=0) - verts.min(axis=0)
+    axes = [flat_axis] + sorted(scanline.get_axes(flat_axis), key=lambda k:-dimensions[k])
+    # Build pixels as minimal boxes along flat_axis, using floors
+    t2 = time()
+    boxes, origin = scanline.tris_to_pixels(verts, tris, voxel_size, flat_axis)
+    t3 = time()
+    # Return
+    return boxes, origin, axes, (t2-t1, t3-t2)
+
+# Sort tessfaces by normal: collection of tessfaces normal to x, to y, to z
+# tessfaces created by the Remesh modifier in BLOCKS mode are perpendicular to a local axis
+# we used a global object, the trick is done: tessfaces are perpendicular to global axis
+# Tessfaces are represented by their centers, as numpy arrays of shape (n, 3).
+
+def _sort_tessfaces_by_normal(centers, normals) -> "x_centers, y_centers, z_centers":
+    """Sort tessfaces centers: normal to x axis, y axis, z axis."""
+    print("BFDS: _sort_tessfaces_by_normal:", len(centers))
+    normals = np.abs(normals)
+    is_x = normals[:,0] > .9 # tessface is normal to x axis
+    is_y = ~is_x & (normals[:,1] > .9) # ... to y axis
+    is_z = ~is_x & ~is_y & (normals[:,2] > .9) # ... to z axis
+    if not np.all(is_x | is_y | is_z): raise ValueError("BFDS: voxel_job._sort_tessfaces_by_normal: abnormal face")
+    return centers[is_x], centers[is_y], centers[is_z]
+
+# First, we transform the global tessface center coordinates
+# in integer coordinates referred to origin point:
+# - voxel_size is used as step;
+# - origin is the first of tessface centers;
+# - (center[0] - origin[0]) / voxel_size is rounded from float to integers: ix, iy, iz
+
+# Then we pile integer heights of floors for each location:
+# (ix, iy -> location int coordinates):
+#    (iz0, iz1, ... -> list of floors int coordinates)
+# This is done in one pass: the int coordinates are lexsorted by location, then by height,
+# and the sorted array is split in floor columns where the location changes.
+
+# Last we use this "floor levels" (eg. izs) to detect solid volumes.
+# Eg. at location (ix, iy) of int coordinates, at izs[0] floor go into solid,
+# at izs[1] go out of solid, at izs[2] go into solid, ...
+# z axis --> floor 0|==solid==1| void 2|==solid==3| void ...
+# If solid is manifold, len(izs) is an even number: go into solid at izs[0], get at last out of it at izs[-1].
+# So, once sorted, consecutive pairs of floors are the boxes.
+
+# In fact this floors can be easily transformed in boxes:
+# (ix0, ix1, iy0, iy1, iz0, iz1)
+# boxes are very alike XBs, but in integer coordinates.
+
+def _tessfaces_to_boxes(centers, voxel_size, axis) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1), origin":
+    """Transform tessfaces centers normal to axis (0: x, 1: y, 2: z) into minimal boxes."""
+    # Integer coordinates of each face (a floor)
+    origin = tuple(centers[0].tolist()) # First tessface center becomes origin
+    ixyzs = np.rint((centers - centers[0]) / voxel_size).astype(np.int32)
+    # Create floors: sort by location, then from bottom to top in +axis direction
+    a, b = [i for i in range(3) if i != axis] # location axes
+    ixyzs = ixyzs[np.lexsort((ixyzs[:,axis], ixyzs[:,b], ixyzs[:,a]))]
+    # Split in floor columns, each column should contain an even number of floors
+    splits = np.flatnonzero(np.any(ixyzs[1:,(a,b)] != ixyzs[:-1,(a,b)], axis=1)) + 1
+    counts = np.diff(np.concatenate(([0], splits, [len(ixyzs)])))
+    if np.any(counts % 2): raise ValueError("BFDS: voxel_job._tessfaces_to_boxes: odd number of floors")
+    # Create minimal boxes, from consecutive pairs of floors
+    floors = ixyzs.reshape(-1, 2, 3)
+    boxes = np.empty((len(floors), 6), dtype=np.int32)
+    boxes[:,0::2], boxes[:,1::2] = floors[:,0,:], floors[:,0,:] # location
+    boxes[:,2*axis+1] = floors[:,1,axis] # top floor
+    return boxes, origin
+
+def _x_tessfaces_to_boxes(x_tessfaces, voxel_size) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1), origin":
+    """Transform _x_tessfaces into minimal boxes."""
+    print("BFDS: _x_tessfaces_to_boxes:", len(x_tessfaces))
+    return _tessfaces_to_boxes(x_tessfaces, voxel_size, axis=0)
+
+def _y_tessfaces_to_boxes(y_tessfaces, voxel_size) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1), origin":
+    """Transform _y_tessfaces into minimal boxes."""
+    print("BFDS: _y_tessfaces_to_boxes:", len(y_tessfaces))
+    return _tessfaces_to_boxes(y_tessfaces, voxel_size, axis=1)
+
+def _z_tessfaces_to_boxes(z_tessfaces, voxel_size) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1), origin":
+    """Transform _z_tessfaces into minimal boxes."""
+    print("BFDS: _z_tessfaces_to_boxes:", len(z_tessfaces))
+    return _tessfaces_to_boxes(z_tessfaces, voxel_size, axis=2)
+
+# Boxes travel through all stages as a compact numpy int32 array of shape (n, 6),
+# xbs as a numpy float64 array of shape (n, 6). Use xbs.tolist() to get the usual list of xbs.
+
+# Merge each box with available neighbour boxes with the same cross-section in axis direction
+# Boxes are lexsorted by cross-section, then by position along axis:
+# joinable boxes become consecutive, and each run of touching boxes is joined in one box.
+# Minimal boxes have unit thickness along the growing axes, so this is the same as growing them;
+# the same is used to join boxes of any thickness split by tile seams.
+
+def _join_boxes_along(boxes, axis) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1)":
+    """Join touching boxes with the same cross-section along axis (not the floors axis)."""
+    print("BFDS: _join_boxes_along:", axis, len(boxes))
+    if not len(boxes): return boxes
+    others = [i for i in range(6) if i // 2 != axis]
+    boxes = boxes[np.lexsort([boxes[:,2*axis]] + [boxes[:,i] for i in reversed(others)])]
+    # Runs of touching boxes with the same cross-section
+    is_joined = np.all(boxes[1:,others] == boxes[:-1,others], axis=1) & (boxes[1:,2*axis] == boxes[:-1,2*axis+1] + 1)
+    starts = np.flatnonzero(np.concatenate(([True], ~is_joined)))
+    ends = np.concatenate((starts[1:], [len(boxes)])) - 1
+    boxes_joined = boxes[starts]
+    boxes_joined[:,2*axis+1] = boxes[ends,2*axis+1]
+    return boxes_joined
+
+def _grow_boxes_along_x(boxes) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1)":
+    """Grow boxes by merging neighbours along x axis."""
+    print("BFDS: _grow_boxes_along_x:", len(boxes))
+    return _join_boxes_along(boxes, axis=0)
+
+def _grow_boxes_along_y(boxes) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1)":
+    """Grow boxes by merging neighbours along y axis."""
+    print("BFDS: _grow_boxes_along_y:", len(boxes))
+    return _join_boxes_along(boxes, axis=1)
+
+def _grow_boxes_along_z(boxes) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1)":
+    """Grow boxes by merging neighbours along z axis."""
+    print("BFDS: _grow_boxes_along_z:", len(boxes))
+    return _join_boxes_along(boxes, axis=2)
+
+_grow_boxes_along = _grow_boxes_along_x, _grow_boxes_along_y, _grow_boxes_along_z
+
+# Greedy merging of boxes in maximal boxes
+# First, minimal boxes are rasterized in an occupancy grid of voxels.
+# Then, starting from the first free voxel, a box is extended as much as possible
+# along the grid 3rd axis, then along the 2nd, then along the 1st.
+# Its voxels are removed from the grid, and the search goes on from the next free voxel.
+# This reduces the number of boxes for L-shapes, staircases, ...
+# The grid memory grows with the bbox volume, not with the number of boxes: for large sparse objects
+# (grid larger than max_grid_size) and when growing gives less boxes, the grown boxes are kept.
+
+max_grid_size = 1 << 24 # Max number of voxels of the occupancy grid, limits peak memory
+
+def _boxes_to_grid(boxes, axis) -> "grid or None, offset":
+    """Rasterize boxes in floors format along axis in an occupancy grid, return it (None if too large) and its int coordinates offset."""
+    # Voxel ranges: lower voxel index and upper voxel index + 1 for each axis
+    ranges = boxes.astype(np.int64)
+    ranges[:,1::2] += 1
+    ranges[:,2*axis+1] -= 1 # along axis boxes are delimited by floors, not voxels
+    offset = ranges[:,0::2].min(axis=0)
+    ranges -= np.repeat(offset, 2)
+    # Fill the grid, using a difference array: +1/-1 at box corners, then cumulative sums
+    shape = ranges[:,1::2].max(axis=0)
+    if np.prod(shape + 1, dtype=np.float64) > max_grid_size: return None, offset
+    diff = np.zeros(shape + 1, dtype=np.int32)
+    for ix in (0, 1):
+        for iy in (0, 1):
+            for iz in (0, 1):
+                sign = (-1) ** (ix + iy + iz)
+                np.add.at(diff, (ranges[:,ix], ranges[:,2+iy], ranges[:,4+iz]), sign)
+    grid = diff.cumsum(axis=0).cumsum(axis=1).cumsum(axis=2)[:-1,:-1,:-1] > 0
+    return grid, offset
+
+def _grid_to_boxes_greedy(grid) -> "[(ix0, ix1, iy0, iy1, iz0, iz1), ...]":
+    """Decompose occupancy grid in maximal boxes, return voxel ranges (upper voxel index + 1)."""
+    grid = grid.copy()
+    grid_flat = grid.ravel() # a view
+    ranges = list()
+    start = 0
+    while True:
+        # Find next free voxel, the search is monotonic in C order
+        start += int(np.argmax(grid_flat[start:]))
+        if not grid_flat[start]: break
+        ix0, iy0, iz0 = np.unravel_index(start, grid.shape)
+        # Grow along 3rd axis, 2nd axis, 1st axis
+        row = grid[ix0,iy0,iz0:]
+        iz1 = iz0 + (np.all(row) and len(row) or int(np.argmin(row)))
+        iy1 = iy0 + 1
+        while iy1 < grid.shape[1] and np.all(grid[ix0,iy1,iz0:iz1]): iy1 += 1
+        ix1 = ix0 + 1
+        while ix1 < grid.shape[0] and np.all(grid[ix1,iy0:iy1,iz0:iz1]): ix1 += 1
+        # Remove its voxels
+        grid[ix0:ix1,iy0:iy1,iz0:iz1] = False
+        ranges.append((int(ix0), ix1, int(iy0), iy1, int(iz0), iz1))
+    return ranges
+
+def _get_greedy_boxes(boxes, axis) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1) or None":
+    """Merge boxes in floors format along axis in maximal boxes, None if the grid is too large."""
+    grid, offset = _boxes_to_grid(boxes, axis)
+    if grid is None: return None
+    ranges = np.array(_grid_to_boxes_greedy(grid), dtype=np.int32).reshape(-1, 6)
+    ranges += np.repeat(offset, 2).astype(np.int32)
+    ranges[:,1::2] -= 1
+    ranges[:,2*axis+1] += 1 # along axis boxes are delimited by floors, not voxels
+    return ranges
+
+def _merge_boxes_greedy(boxes, axes) -> "boxes array of (ix0, ix1, iy0, iy1, iz0, iz1)":
+    """Merge boxes in floors format along the 1st of axes in maximal boxes, or grow them if less."""
+    print("BFDS: _merge_boxes_greedy:", len(boxes))
+    if not len(boxes): return boxes
+    boxes_grown = _grow_boxes_along[axes[2]](_grow_boxes_along[axes[1]](boxes))
+    boxes_greedy = _get_greedy_boxes(boxes, axes[0])
+    if boxes_greedy is None or len(boxes_grown) <= len(boxes_greedy): return boxes_grown
+    return boxes_greedy
+
+# Trasform boxes in int coordinates to xbs in global coordinates
+# Along the floors axis, boxes are at floor level, along the other axes at voxel centers:
+# they are moved to the voxel corners, and an epsilon is added for overlapping boxes.
+
+def _boxes_to_xbs(boxes, voxel_size, origin, axis) -> "xbs array of (x0, x1, y0, y1, z0, z1)":
+    """Trasform boxes (int coordinates) in floors format along axis to xbs (global coordinates)."""
+    xbs = boxes * voxel_size + np.repeat(origin, 2)
+    movement = np.array((-1., 1.) * 3) * (voxel_size / 2.) # movement to lower left and upper right corners
+    movement[2*axis:2*axis+2] = 0. # this is already at floor level
+    xbs += movement + np.array((-epsilon, epsilon) * 3)
+    return xbs
+
+def _x_boxes_to_xbs(boxes, voxel_size, origin) -> "xbs array of (x0, x1, y0, y1, z0, z1)":
+    """Trasform boxes (int coordinates) to xbs (global coordinates)."""
+    print("BFDS: _x_boxes_to_xbs:", len(boxes))
+    return _boxes_to_xbs(boxes, voxel_size, origin, axis=0)
+
+def _y_boxes_to_xbs(boxes, voxel_size, origin) -> "xbs array of (x0, x1, y0, y1, z0, z1)":
+    """Trasform boxes (int coordinates) to xbs (global coordinates)."""
+    print("BFDS: _y_boxes_to_xbs:", len(boxes))
+    return _boxes_to_xbs(boxes, voxel_size, origin, axis=1)
+
+def _z_boxes_to_xbs(boxes, voxel_size, origin) -> "xbs array of (x0, x1, y0, y1, z0, z1)":
+    """Trasform boxes (int coordinates) to xbs (global coordinates)."""
+    print("BFDS: _z_boxes_to_xbs:", len(boxes))
+    return _boxes_to_xbs(boxes, voxel_size, origin, axis=2)
+
+_boxes_to_xbs_along = _x_boxes_to_xbs, _y_boxes_to_xbs, _z_boxes_to_xbs
+
+# Flatten xbs to obtain pixels, in place
+
+def _x_flatten_xbs(xbs, flat_origin) -> "xbs array of (l0, l0, y0, y1, z0, z1)":
+    """Flatten voxels to obtain pixels (normal to x axis) at flat_origin height."""
+    print("BFDS: _x_flatten_xbs:", len(xbs))
+    xbs[:,0:2] = flat_origin[0]
+    return xbs
+
+def _y_flatten_xbs(xbs, flat_origin) -> "xbs array of (x0, x1, l0, l0, z0, z1)":
+    """Flatten voxels to obtain pixels (normal to y axis) at flat_origin height."""
+    print("BFDS: _y_flatten_xbs:", len(xbs))
+    xbs[:,2:4] = flat_origin[1]
+    return xbs
+
+def _z_flatten_xbs(xbs, flat_origin) -> "xbs array of (x0, x1, y0, y1, l0, l0)":
+    """Flatten voxels to obtain pixels (normal to z axis) at flat_origin height."""
+    print("BFDS: _z_flatten_xbs:", len(xbs))
+    xbs[:,4:6] = flat_origin[2]
+    return xbs
+
+_flatten_xbs_along = _x_flatten_xbs, _y_flatten_xbs, _z_flatten_xbs
@@ -0,0 +1,88 @@
+"""BlenderFDS, export profiler"""
+
+import os, json, csv
+from time import time
+from contextlib import contextmanager
+
+# While the profiler is active (opt-in, eg. during an export), the export records for each object:
+# its namelist, the wall time spent generating its FDS text, the part of it spent
+# in geometry (geometry.to_fds.ob_to_*), the number of XBs and the bytes emitted;
+# and for each BFProp class the cumulative wall time of its to_fds.
+# The profile is written in JSON and CSV files next to the FDS file.
+
+_profile = None # {"objects": {ob.name: {...}, ...}, "props": {BFProp class name: wall time, ...}}, None if not active
+
+@contextmanager
+def profile_context(active=True):
+    """Activate the profiler, if requested, till the end of the context."""
+    global _profile
+    if not active or _profile is not None: # not requested or already active
+        yield
+        return
+    _profile = {"objects": dict(), "props": dict()}
+    try: yield
+    finally: _profile = None
+
+def is_active() -> "bool":
+    """Check if the profiler is active."""
+    return _profile is not None
+
+def _get_record(name) -> "dict":
+    """Get the record of object name."""
+    record = _profile["objects"].get(name)
+    if record is None:
+        record = _profile["objects"][name] = {"namelist": None, "t_total": 0., "t_geometry": 0., "n_xbs": 0, "bytes": 0}
+    return record
+
+def add(name, key, value) -> "None":
+    """Add value to key of the record of object name, if the profiler is active."""
+    if _profile is not None: _get_record(name)[key] += value
+
+def add_prop(name, t) -> "None":
+    """Add wall time t to BFProp class name, if the profiler is active."""
+    if _profile is not None: _profile["props"][name] = _profile["props"].get(name, 0.) + t
+
+def profile_pieces(name, namelist, pieces):
+    """Yield text pieces of object name, record the time spent generating them and their bytes, if the profiler is active."""
+    if _profile is None:
+        yield from pieces
+        return
+    record = _get_record(name)
+    record["namelist"] = namelist
+    pieces = iter(pieces)
+    while True:
+        t0 = time()
+        try: piece = next(pieces)
+        except StopIteration: break
+        finally: record["t_total"] += time() - t0
+        record["bytes"] += len(piece.encode("utf-8"))
+        yield piece
+
+def get_slowest(n=5) -> "[(ob.name, wall time), ...]":
+    """Get the n slowest objects."""
+    if _profile is None: return list()
+    items = sorted(_profile["objects"].items(), key=lambda k:-k[1]["t_total"])
+    return [(name, record["t_total"]) for name, record in items[:n]]
+
+def save(filepath) -> "None":
+    """Save the profile in JSON and CSV files next to filepath."""
+    if _profile is None: return
+    basepath = os.path.splitext(filepath)[0]
+    # Aggregate objects by namelist
+    namelists = dict()
+    for record in _profile["objects"].values():
+        total = namelists.setdefault(record["namelist"] or "None", {"n_objects": 0, "t_total": 0., "t_geometry": 0., "n_xbs": 0, "bytes": 0})
+        total["n_objects"] += 1
+        for key in ("t_total", "t_geometry", "n_xbs", "bytes"): total[key] += record[key]
+    # Write
+    keys = "namelist", "t_total", "t_geometry", "n_xbs", "bytes"
+    items = sorted(_profile["objects"].items(), key=lambda k:-k[1]["t_total"])
+    try:
+        with open(basepath + ".profile.json", "w") as f:
+            json.dump({"objects": _profile["objects"], "namelists": namelists, "props": _profile["props"]}, f, indent=1, sort_keys=True)
+        with open(basepath + ".profile.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("object",) + keys)
+            for name, record in items: writer.writerow([name] + [record[key] for key in keys])
+    except IOError as err: print("BFDS: profiler.save: cannot save:", err)
+    else: print("BFDS: profiler.save:", basepath + ".profile.json")
@@ -1,3 +1,3 @@
 """BlenderFDS, FDS related routines"""
 
-from . import export
+from . import export, bench_voxelize, bench_export
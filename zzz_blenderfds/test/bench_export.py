@@ -0,0 +1,104 @@
+"""BlenderFDS, export walk benchmark on synthetic object trees"""
+
+import time
+from random import Random
+
+from .term_colors import *
+from ..bl.extensions import BFObject, children_context
+
+# Synthetic trees of objects are built as plain Python objects with the attributes used
+# by the export walk (name, parent, bf_namelist_cls), so the walk is benchmarked
+# on tens of thousands of objects without creating them in Blender.
+# The actual export walk (BFObject._children_to_fds) is run, each object exporting its name only:
+# in the children context (one parent to children index per export) and without it,
+# scanning all objects for the children of each visited object.
+
+### Synthetic trees
+
+class SyntheticObject(BFObject):
+    """Object with the attributes used by the export walk, exporting its name."""
+
+    def __init__(self, name, parent, bf_namelist_cls):
+        self.name = name
+        self.parent = parent
+        self.bf_namelist_cls = bf_namelist_cls
+
+    def _myself_to_fds(self, context):
+        yield self.name + "\n"
+
+class SyntheticScene():
+    def __init__(self, obs):
+        self.objects = obs
+
+class SyntheticContext():
+    def __init__(self, obs):
+        self.scene = SyntheticScene(obs)
+
+def get_tree(n, seed=0) -> "[ob, ...]":
+    """Get n objects, one third of them child of a random previous object, 1% MESH."""
+    rng = Random(seed)
+    numbers = rng.sample(range(10 * n), n) # unique names, random order
+    obs = list()
+    for i in range(n):
+        parent = i and rng.random() < .33 and obs[rng.randrange(i)] or None
+        bf_namelist_cls = rng.random() < .01 and "ON_MESH" or "ON_OBST"
+        obs.append(SyntheticObject("Object.{:06d}".format(numbers[i]), parent, bf_namelist_cls))
+    return obs
+
+### Walks
+
+def _walk(context) -> "[ob.name, ...]":
+    """Run the export walk from the objects without a parent, get the exported names."""
+    return [name for name in "".join(BFObject._children_to_fds(None, context)).split("\n") if name]
+
+def walk_indexed(obs) -> "[ob.name, ...]":
+    """Run the export walk in the children context, with a parent to children index."""
+    context = SyntheticContext(obs)
+    with children_context(context): return _walk(context)
+
+def walk_scan(obs) -> "[ob.name, ...]":
+    """Run the export walk without the children context, scanning all objects for the children of each one."""
+    return _walk(SyntheticContext(obs))
+
+def get_expected_names(obs) -> "[ob.name, ...]":
+    """Get the expected export order: depth first, MESHes first, then by name."""
+    index = dict()
+    for ob in obs: index.setdefault(ob.parent and ob.parent.name, list()).append(ob)
+    for children_obs in index.values(): children_obs.sort(key=lambda k:(k.bf_namelist_cls!="ON_MESH", k.name))
+    names, stack = list(), list(reversed(index.get(None, ())))
+    while stack:
+        ob = stack.pop()
+        names.append(ob.name)
+        stack.extend(reversed(index.get(ob.name, ())))
+    return names
+
+### Benchmark
+
+sizes = 1000, 5000, 10000, 50000
+max_scan_size = 5000 # the scan walk is quadratic
+
+def bench_walk(walk, obs) -> "float":
+    """Get walk wall time."""
+    t0 = time.time()
+    walk(obs)
+    return time.time() - t0
+
+def test_walk(tolerance=3.):
+    """Benchmark the export walk, check it scales linearly and gives the expected order, with and without index."""
+    print_h1("Benchmarking export walk")
+    regressions, times_per_ob = list(), list()
+    for n in sizes:
+        obs = get_tree(n)
+        t = bench_walk(walk_indexed, obs)
+        times_per_ob.append(t / n)
+        msg = "{} objects: indexed {:.3f} s".format(n, t)
+        if walk_indexed(obs) != get_expected_names(obs): regressions.append("{} objects: wrong order".format(n))
+        if n <= max_scan_size:
+            msg += ", scan {:.3f} s".format(bench_walk(walk_scan, obs))
+            if walk_indexed(obs) != walk_scan(obs): regressions.append("{} objects: different order".format(n))
+        print(msg)
+    if max(times_per_ob) > tolerance * min(times_per_ob):
+        regressions.append("Not linear: {:.2e} to {:.2e} s per object".format(min(times_per_ob), max(times_per_ob)))
+    for regression in regressions: print_fail(regression)
+    if not regressions: print_ok("Linear scaling, expected order")
+    return regressions
@@ -0,0 +1,214 @@
+"""BlenderFDS, voxelization benchmark on synthetic meshes"""
+
+import os, sys, json, time, tracemalloc
+import numpy as np
+
+try: # in Blender, as part of the test package
+    from .term_colors import *
+    from ..geometry import voxel_job, scanline
+except (ImportError, SystemError): # outside Blender: python3 bench_voxelize.py
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "geometry"))
+    from term_colors import *
+    import voxel_job, scanline
+
+# Synthetic meshes are built as numpy arrays of global vertices and triangles,
+# so the pure computation part of voxelization (voxel_job.run_voxelize_job) is benchmarked
+# without Blender, that is only needed by the remesh modifier: its tessfaces are built
+# as the boundary faces of the mesh voxels. Each case records stage wall times, peak memory and box counts.
+# The results are compared to the baseline report in test/ref.
+
+baseline_filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ref", "bench_voxelize.json")
+
+### Synthetic meshes
+
+def get_box(x0, x1, y0, y1, z0, z1, inward=False) -> "verts, tris":
+    """Get a closed box."""
+    verts = np.array([(x, y, z) for x in (x0, x1) for y in (y0, y1) for z in (z0, z1)], dtype=np.float64)
+    quads = ((0,1,3,2), (4,6,7,5), (0,4,5,1), (2,3,7,6), (0,2,6,4), (1,5,7,3))
+    tris = np.array([tri for q in quads for tri in ((q[0], q[1], q[2]), (q[0], q[2], q[3]))], dtype=np.int64)
+    if inward: tris = tris[:,::-1]
+    return verts, tris
+
+def join_meshes(meshes) -> "verts, tris":
+    """Join meshes in one."""
+    verts, tris, n = list(), list(), 0
+    for v, t in meshes:
+        verts.append(v)
+        tris.append(t + n)
+        n += len(v)
+    return np.concatenate(verts), np.concatenate(tris)
+
+def get_surface(f, nu, nv, closed_v) -> "verts, tris":
+    """Get a closed parametric surface, f(u, v) for u in 0..1 (open), v in 0..1 (periodic)."""
+    u, v = np.meshgrid(np.arange(nu) / nu, np.arange(nv) / nv, indexing="ij")
+    verts = f(u.ravel(), v.ravel())
+    i, j = np.meshgrid(np.arange(nu), np.arange(nv), indexing="ij")
+    a = i * nv + j
+    b = i * nv + (j + 1) % nv
+    c = ((i + 1) % nu) * nv + j
+    d = ((i + 1) % nu) * nv + (j + 1) % nv
+    if not closed_v: # drop the quads joining last and first u rings
+        a, b, c, d = a[:-1], b[:-1], c[:-1], d[:-1]
+    tris = np.concatenate((np.stack((a, c, d), -1).reshape(-1, 3), np.stack((a, d, b), -1).reshape(-1, 3)))
+    return verts, tris
+
+def get_sphere(r=5., n=64) -> "verts, tris":
+    """Get a closed uv sphere with poles."""
+    def f(u, v):
+        th, ph = np.pi * (u * (n - 1) + 1) / (n + 1), 2 * np.pi * v
+        return np.stack((r * np.sin(th) * np.cos(ph), r * np.sin(th) * np.sin(ph), r * np.cos(th)), -1)
+    verts, tris = get_surface(f, n, n, closed_v=False)
+    # Close the poles with fans
+    top, bottom = len(verts), len(verts) + 1
+    j = np.arange(n)
+    fans = np.concatenate((
+        np.stack((np.full(n, top), (j + 1) % n, j), -1),
+        np.stack((np.full(n, bottom), (n - 1) * n + j, (n - 1) * n + (j + 1) % n), -1),
+    ))
+    verts = np.concatenate((verts, ((0., 0., r), (0., 0., -r))))
+    return verts, np.concatenate((tris, fans))
+
+def get_torus(r0=5., r1=1.5, n=96) -> "verts, tris":
+    """Get a closed torus."""
+    def f(u, v):
+        th, ph = 2 * np.pi * u, 2 * np.pi * v
+        return np.stack(((r0 + r1 * np.cos(ph)) * np.cos(th), (r0 + r1 * np.cos(ph)) * np.sin(th), r1 * np.sin(ph)), -1)
+    return get_surface(f, n, n // 3, closed_v=True)
+
+def get_hollow_box(l=10., t=.5) -> "verts, tris":
+    """Get a hollow box, walls t thick."""
+    return join_meshes((get_box(0., l, 0., l, 0., l), get_box(t, l-t, t, l-t, t, l-t, inward=True)))
+
+def get_staircase(n=40, w=2., h=.25, d=.3) -> "verts, tris":
+    """Get a staircase of n steps, as touching boxes."""
+    return join_meshes([get_box(i*d, (i+1)*d, 0., w, 0., (i+1)*h) for i in range(n)])
+
+def get_clutter(n=400, l=20., seed=0) -> "verts, tris":
+    """Get random OBST clutter, as n random boxes each in its own cell of a grid."""
+    rng = np.random.RandomState(seed)
+    side = int(np.ceil(np.sqrt(n)))
+    cell = l / side
+    meshes = list()
+    for i in range(n):
+        x, y = (i % side) * cell, (i // side) * cell
+        x0, y0 = x + rng.uniform(0., .3) * cell, y + rng.uniform(0., .3) * cell
+        x1, y1 = x0 + rng.uniform(.2, .7) * cell, y0 + rng.uniform(.2, .7) * cell
+        meshes.append(get_box(x0, x1, y0, y1, 0., rng.uniform(.5, 3.)))
+    return join_meshes(meshes)
+
+def get_remesh_tessfaces(verts, tris, voxel_size) -> "centers, normals":
+    """Get the tessfaces of the mesh remeshed in BLOCKS mode, as the boundary faces of its voxels."""
+    boxes, origin = scanline.tris_to_boxes(verts, tris, voxel_size, 0)
+    grid, offset = voxel_job._boxes_to_grid(boxes, 0)
+    centers, normals = list(), list()
+    for axis in range(3):
+        pad = [(0, 0)] * 3
+        pad[axis] = (1, 1)
+        is_face = np.diff(np.pad(grid, pad, "constant").astype(np.int8), axis=axis) # +1 in, -1 out
+        ijks = np.argwhere(is_face).astype(np.float64) + offset
+        ijks[:,axis] -= .5 # face between voxels
+        ijks[:,0] += .5 # along 1st axis, voxels are between floors
+        centers.append(ijks * voxel_size + origin)
+        axis_normals = np.zeros((len(ijks), 3))
+        axis_normals[:,axis] = is_face[is_face != 0]
+        normals.append(axis_normals)
+    return np.concatenate(centers), np.concatenate(normals)
+
+meshes = (
+    ("sphere", get_sphere),
+    ("torus", get_torus),
+    ("hollow_box", get_hollow_box),
+    ("staircase", get_staircase),
+    ("clutter", get_clutter),
+)
+
+voxel_sizes = .4, .2, .1
+
+jobs_settings = (
+    ("REMESH", "GROW"),
+    ("SCANLINE", "GROW"),
+    ("SCANLINE", "GREEDY"),
+    ("TILED", "GROW"),
+)
+
+min_time = .25 # s, shorter times are too noisy to be compared to baseline
+
+### Benchmark
+
+def bench_case(verts, tris, voxel_size, engine, merge) -> "dict":
+    """Run a voxelization job, return its stage wall times, peak memory and box counts."""
+    job = {"engine": engine, "merge": merge, "voxel_size": voxel_size, "flat_origin": None}
+    if engine == "REMESH": job["centers"], job["normals"] = get_remesh_tessfaces(verts, tris, voxel_size)
+    else: job["verts"], job["tris"] = verts, tris
+    tracemalloc.start()
+    t0 = time.time()
+    xbs, voxel_size, timing, n_boxes = voxel_job.run_voxelize_job(job)
+    t_total = time.time() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "t_axes": timing[0], "t_boxes": timing[1], "t_merge": timing[2], "t_xbs": timing[3], "t_total": t_total,
+        "peak_memory": peak, "n_boxes": n_boxes, "n_xbs": len(xbs),
+    }
+
+def bench_all() -> "{'mesh/voxel_size/engine/merge': {...}, ...}":
+    """Run all benchmark cases."""
+    results = dict()
+    for mesh_name, get_mesh in meshes:
+        verts, tris = get_mesh()
+        for voxel_size in voxel_sizes:
+            for engine, merge in jobs_settings:
+                name = "{}/{}/{}/{}".format(mesh_name, voxel_size, engine, merge)
+                result = bench_case(verts, tris, voxel_size, engine, merge)
+                print("{}: {:.3f} s, {:.1f} MB, {} xbs".format(name, result["t_total"], result["peak_memory"] / 1E6, result["n_xbs"]))
+                results[name] = result
+    return results
+
+def compare(results, baseline, tolerance=1.25) -> "list of regressions":
+    """Compare results with baseline, report time and memory regressions over tolerance and changed box counts."""
+    regressions = list()
+    for name, result in sorted(results.items()):
+        ref = baseline.get(name)
+        if not ref: continue
+        for key in ("t_total", "peak_memory"):
+            if key == "t_total" and ref[key] < min_time: continue # too noisy
+            if ref[key] > 0. and result[key] > ref[key] * tolerance:
+                regressions.append("{}: {} {:.4g} (baseline {:.4g})".format(name, key, result[key], ref[key]))
+        if result["n_xbs"] != ref["n_xbs"]:
+            regressions.append("{}: n_xbs {} (baseline {})".format(name, result["n_xbs"], ref["n_xbs"]))
+    return regressions
+
+def test_voxelize(report_filepath=None, baseline_filepath=baseline_filepath, tolerance=1.25):
+    """Benchmark voxelization, write JSON report and compare it to the baseline report (None to skip)."""
+    print_h1("Benchmarking voxelization")
+    results = bench_all()
+    if report_filepath:
+        with open(report_filepath, "w") as f: json.dump(results, f, indent=1, sort_keys=True)
+        print("Report written to:", report_filepath)
+    if baseline_filepath:
+        print_h2("Comparing to baseline <{}>".format(baseline_filepath))
+        with open(baseline_filepath) as f: baseline = json.load(f)
+        regressions = compare(results, baseline, tolerance)
+        for regression in regressions: print_fail(regression)
+        if not regressions: print_ok("No regressions")
+        return regressions
+
+def test_greedy():
+    """Check that greedy merging never gives more boxes than growing, for any mesh and engine."""
+    print_h1("Checking greedy merging")
+    failures = list()
+    for mesh_name, get_mesh in meshes:
+        verts, tris = get_mesh()
+        for voxel_size in voxel_sizes:
+            for engine in ("SCANLINE", "TILED"):
+                n_grow = bench_case(verts, tris, voxel_size, engine, "GROW")["n_xbs"]
+                n_greedy = bench_case(verts, tris, voxel_size, engine, "GREEDY")["n_xbs"]
+                if n_greedy > n_grow:
+                    failures.append("{}/{}/{}: GREEDY {} > GROW {} xbs".format(mesh_name, voxel_size, engine, n_greedy, n_grow))
+    for failure in failures: print_fail(failure)
+    if not failures: print_ok("GREEDY boxes <= GROW boxes")
+    return failures
+
+if __name__ == "__main__":
+    failures = test_greedy() + (test_voxelize(report_filepath=len(sys.argv) > 1 and sys.argv[1] or None) or list())
+    sys.exit(failures and 1 or 0)
@@ -1,12 +1,13 @@
 """BlenderFDS, types"""
 
+from time import time
 from bpy.props import *
 from bpy.types import Scene, Object, Material
 
 from .exceptions import BFException
 from .utils import is_iterable, ClsList
 
-from . import config
+from . import config, profiler
 
 DEBUG = False
 
@@ -33,6 +34,31 @@ def subscribe(cls):
 # the BFNamelist and all related BFProps are instantiated, then quickily forgotten
 # This mechanism is used to draw panels and to export to FDS.
 
+### Cache of instances
+
+# BFNamelist instances, with all their BFProp instances, are cached by element pointer and class,
+# so the panels, redrawn very often, and the export do not instantiate them again at each access.
+# At each access the cached instance is bound again to the element and its infos are reset.
+# Undo reallocates the elements, so the cache is cleared on undo and redo, on file load and after each export.
+# BFProp instances read the element properties on demand, so they are never stale:
+# a change of bf_namelist_cls selects another instance, a change of any other property needs nothing.
+# __slots__ are not used: BFProp and BFNamelist classes define their defaults as class attributes
+# (bf_props, bf_prop_export, ...), that instances override, and slots cannot shadow class attributes.
+
+_instances = dict() # {(element pointer, cls): instance, ...}
+
+def get_instance(cls, element) -> "BFNamelist or BFProp instance":
+    """Get the cached instance of cls for element, reset for reuse."""
+    key = element.as_pointer(), cls
+    instance = _instances.get(key)
+    if instance is None: instance = _instances[key] = cls(element)
+    else: instance._reset(element)
+    return instance
+
+def clear_instances() -> "None":
+    """Clear the cache of instances, eg. when a new file is loaded, after undo and after each export."""
+    _instances.clear()
+
 #@subscribe This will be used to subscribe the class to the collections
 class _BFCommon():
     """Common part of BFProp and BFNamelist"""
@@ -68,6 +94,13 @@ class _BFCommon():
         # Init exporting variables
         self.infos = list()
 
+    def _reset(self, element):
+        """Reset me and my BFProp instances for reuse with element."""
+        self.element = element
+        self.infos = list()
+        if self.bf_prop_export: self.bf_prop_export._reset(element)
+        for bf_prop in self.bf_props or tuple(): bf_prop._reset(element)
+
     def __repr__(self):
         return "{__class__.__name__!s}(element={element!r})".format(
             __class__ = self.__class__, **self.__dict__)
@@ -308,6 +341,10 @@ class BFNamelist(_BFCommon):
 
     def format(self, context, params):
         """Format to FDS notation."""
+        return "".join(self.format_pieces(context, params))
+
+    def format_pieces(self, context, params):
+        """Format to FDS notation, yield text pieces."""
         # Expected output:
         # ! name: info message 1
         # ! name: info message 2
@@ -319,8 +356,7 @@ class BFNamelist(_BFCommon):
         # Set fds_label, if empty use first param (OP_free_namelist)
         fds_label = "".join(("&", self.fds_label or params.pop(0), " "))
         # Set info
-        infos = [is_iterable(info) and info[0] or info for info in self.infos]
-        info = "".join(("! {}\n".format(info) for info in infos))
+        for info in self.infos: yield "! {}\n".format(is_iterable(info) and info[0] or info)
         # Extract the first and only multiparams from params
         multiparams = None
         for param in params:
@@ -336,37 +372,49 @@ class BFNamelist(_BFCommon):
         # ... and join remaining params + namelist closure
         params.append("/\n")
         param = separator.join(params)
-        # Build namelists, set body
+        # Build namelists, one piece each
         # &fds_label multiparam param /
         if multiparams:
-            body = "".join((
-                separator.join(("".join((fds_label, multiparam)), param)) for multiparam in multiparams
-            ))
+            for multiparam in multiparams: yield separator.join(("".join((fds_label, multiparam)), param))
         else:
-            body = "".join((fds_label, param))
-        # Return
-        return "".join((info, body))
+            yield "".join((fds_label, param))
 
-    def to_fds(self, context) -> "str or None":
-        """Get my exported FDS string, on error raise BFException."""
-        DEBUG and print("BFDS: BFNamelist.to_fds:", str(self))
+    def get_other_params(self, context) -> "tuple":
+        """Get my exported FDS params, except ID and geometric ones, on error raise BFException."""
+        params = list()
+        for bf_prop in self.bf_props or tuple():
+            if bf_prop.fds_label == "ID" or isinstance(bf_prop, BFGeometryProp): continue
+            params.append(bf_prop.to_fds(context))
+        return tuple(params)
+
+    def to_fds(self, context, extra_params=()) -> "str or None":
+        """Get my exported FDS string, append extra_params (eg. MULT_ID), on error raise BFException."""
+        return "".join(self.to_fds_pieces(context, extra_params)) or None
+
+    def to_fds_pieces(self, context, extra_params=()):
+        """Get my exported FDS string, append extra_params (eg. MULT_ID), yield text pieces, on error raise BFException."""
+        DEBUG and print("BFDS: BFNamelist.to_fds_pieces:", str(self))
         # Check self
-        if not self.get_exported(context): return None
+        if not self.get_exported(context): return
         self.check(context)
         # Check and eval my bf_props
         params = list()
         errors = list()
         # Export my bf_props
+        is_profiled = profiler.is_active()
         for bf_prop in self.bf_props or tuple():
+            t0 = is_profiled and time()
             try: param = bf_prop.to_fds(context)
             except BFException as err: errors.append(err)
             else:
                 if param: params.append(param)
                 self.infos.extend(bf_prop.infos)
+            if is_profiled: profiler.add_prop(bf_prop.__class__.__name__, time()-t0)
         # Re-raise occurred errors
         if errors: raise BFException(self, "Following errors reported", errors)
-        # Return
-        return self.format(context, params)
+        params.extend(extra_params)
+        # Yield
+        yield from self.format_pieces(context, params)
 
     # Import
 
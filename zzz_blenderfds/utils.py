@@ -1,5 +1,7 @@
 """BlenderFDS, other utilities"""
 
+import os, tempfile, threading
+
 # Check if a quantity is an iterable type
 
 def is_iterable(var):
@@ -19,45 +21,175 @@ def is_iterable(var):
 # Collection of classes
 
 class ClsList(list):
-    """List of classes"""
-
-    def __contains__(self,key):
-        if isinstance(key,str):
-            for value in self:
-                if value.__name__ == key: return True
-            else: return False
-        return list.__contains__(self,key)
+    """List of classes, indexed by name and by fds_label (first match wins), in insertion order"""
+
+    def __init__(self, values=()):
+        super().__init__()
+        self._by_name, self._by_fds_label = dict(), dict()
+        self.extend(values)
+
+    def _index(self, value):
+        name = getattr(value, "__name__", None) # instances have no name
+        if name: self._by_name.setdefault(name, value)
+        fds_label = getattr(value, "fds_label", None)
+        if fds_label: self._by_fds_label.setdefault(fds_label, value)
+
+    def _reindex(self):
+        self._by_name.clear()
+        self._by_fds_label.clear()
+        for value in self: self._index(value)
+
+    def append(self, value):
+        super().append(value)
+        self._index(value)
+
+    def extend(self, values):
+        for value in values: self.append(value)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def insert(self, index, value):
+        super().insert(index, value)
+        self._reindex()
+
+    def remove(self, value):
+        super().remove(value)
+        self._reindex()
+
+    def pop(self, index=-1):
+        value = super().pop(index)
+        self._reindex()
+        return value
+
+    def clear(self):
+        super().clear()
+        self._reindex()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._reindex()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._reindex()
+
+    def __contains__(self, key):
+        if isinstance(key, str): return key in self._by_name
+        name = getattr(key, "__name__", None)
+        if name and self._by_name.get(name) is key: return True
+        return list.__contains__(self, key)
     
-    def __getitem__(self,key):
-        if isinstance(key,str):
-            for value in self:
-                if value.__name__ == key: return value
-                raise KeyError(key)    
-        return super().__getitem__(self,key)
-
-    def get(self,key,default=None):
-        for value in self:
-            if value.__name__ == key: return value
-        return default
-
-    def get_by_fds_label(self,key,default=None):
+    def __getitem__(self, key):
+        if isinstance(key, str): return self._by_name[key]
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        return self._by_name.get(key, default)
+
+    def get_by_fds_label(self, key, default=None):
         if not key: return default
-        for value in self:
-            if value.fds_label == key: return value
-        return default
+        return self._by_fds_label.get(key, default)
 
 # Write to file
-        
+
+# Output files are written to a temporary file in the same directory, with a large buffer,
+# then synced to disk and renamed to the target. The rename is atomic,
+# so an interrupted export never leaves a half-written file.
+
+buffer_size = 1048576 # bytes
+
 def is_writable(filepath):
-    """Check if filepath is writable"""
-    return write_to_file(filepath, " ")
+    """Check if filepath is writable, without touching it"""
+    if os.path.isdir(filepath): return False
+    if os.path.exists(filepath) and not os.access(filepath, os.W_OK): return False
+    return os.access(os.path.dirname(filepath) or os.curdir, os.W_OK | os.X_OK)
+
+def _get_mode(filepath):
+    """Get the permission mode of filepath, or the default one if it does not exist"""
+    try: return os.stat(filepath).st_mode & 0o7777
+    except OSError: pass
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+class AtomicFile():
+    """Text file written to a temporary file in the same directory, that replaces filepath on commit"""
+
+    def __init__(self, filepath, buffer_size=buffer_size):
+        self.filepath = filepath
+        directory, basename = os.path.split(filepath)
+        fd, self.tmp_filepath = tempfile.mkstemp(prefix=".{}.".format(basename), suffix=".tmp", dir=directory or os.curdir)
+        self.file = os.fdopen(fd, "w", buffering=buffer_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None: self.commit()
+        else: self.discard()
+
+    def write(self, text):
+        self.file.write(text)
+
+    def writelines(self, pieces):
+        self.file.writelines(pieces)
+
+    def commit(self):
+        """Sync the temporary file to disk and rename it to filepath"""
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            os.chmod(self.tmp_filepath, _get_mode(self.filepath))
+            os.replace(self.tmp_filepath, self.filepath)
+        except BaseException: # also on interruption, then re-raised
+            self.discard()
+            raise
+
+    def discard(self):
+        """Close and remove the temporary file"""
+        self.file.close()
+        try: os.remove(self.tmp_filepath)
+        except OSError: pass
+
+class BackgroundWriter(threading.Thread):
+    """Write the text pieces of get_pieces(*args) to an AtomicFile in a background thread"""
+
+    def __init__(self, filepath, get_pieces, *args):
+        threading.Thread.__init__(self, daemon=True)
+        self.atomic_file = AtomicFile(filepath) # opened by the caller, so it gets errors early
+        self.get_pieces, self.args = get_pieces, args
+        self.error = None
+
+    def run(self):
+        try: self.atomic_file.writelines(self.get_pieces(*self.args))
+        except Exception as err: self.error = err
+
+    def commit(self):
+        """Wait for the thread, then commit the file; return False if not written"""
+        self.join()
+        if self.error is not None:
+            self.atomic_file.discard()
+            return False
+        try: self.atomic_file.commit()
+        except IOError: return False
+        return True
+
+    def discard(self):
+        """Wait for the thread, then discard the file"""
+        self.join()
+        self.atomic_file.discard()
 
 def write_to_file(filepath, text_file):
-    """Write text_file to filepath"""
-    if text_file is None: text_file = str()
+    """Write text_file to filepath, atomically"""
+    return write_pieces_to_file(filepath, (text_file or str(),))
+
+def write_pieces_to_file(filepath, pieces, buffer_size=buffer_size):
+    """Write text pieces to filepath while they are generated, buffered and atomically"""
     try:
-        with open(filepath, "w") as out_file: out_file.write(text_file)
+        with AtomicFile(filepath, buffer_size) as out_file: out_file.writelines(pieces)
         return True
     except IOError:
         return False
-